@@ -0,0 +1,213 @@
+#! /usr/bin/env python
+'''
+Solve many Galaxies puzzles at once across a pool of worker processes.
+
+Puzzles can be given as ascii board or savefile files, directories of them, or
+JSONL files holding one puzzle per line. A JSONL puzzle may also be a game ID
+like '7x7dn:fhwszzidfjhkc'. Results are written to stdout as JSONL.
+'''
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import instrument
+import solutions
+import solver
+
+caches = {} # Open solution caches of this process, by path
+
+def read_puzzles(paths):
+    '''
+    Yields a (name, text) pair for every puzzle found in the paths.
+    A JSONL line may be a bare board string or an object with a 'board' and
+    optionally a 'name'. Boards may be ascii, savefiles or game IDs.
+    '''
+    for path in paths:
+        if os.path.isdir(path):
+            for filename in sorted(os.listdir(path)):
+                if os.path.isfile(os.path.join(path, filename)):
+                    yield from read_puzzles([os.path.join(path, filename)])
+        elif path.endswith('.jsonl'):
+            with open(path) as stream:
+                for linenum, line in enumerate(stream, 1):
+                    if not line.strip():
+                        continue
+                    puzzle = json.loads(line)
+                    if isinstance(puzzle, str):
+                        puzzle = {'board': puzzle}
+                    yield puzzle.get('name', '{}:{}'.format(path, linenum)), puzzle['board']
+        else:
+            with open(path) as stream:
+                yield path, stream.read()
+
+def solve_puzzle(name, text, method='rules', stats=False, cache=None, count=None, timeout=None,
+                 steps=None, deadline=None):
+    '''
+    Solve one puzzle and return its result as a dict. With stats the per rule
+    counts of the solve are included. cache is the path of a solutions cache
+    to use, opened once per process. With count the solutions are counted up
+    to that limit instead, and the cache is not used. timeout and steps stop
+    the solve early, and an unsolved result then holds what was found as its
+    'partial'. deadline is a time.monotonic() to stop by however long the
+    puzzle waited before getting here, and wins if it is sooner than timeout.
+    '''
+    if deadline is not None:
+        remaining = deadline-time.monotonic()
+        timeout = remaining if timeout is None else min(timeout, remaining)
+    if count is not None:
+        return count_puzzle(name, text, count, timeout, steps)
+    if cache is not None and cache not in caches:
+        caches[cache] = solutions.cache(cache)
+    start = time.perf_counter()
+    hits = caches[cache].hits if cache is not None else 0
+    try:
+        current = solver.solve(text, method, instrument.stats() if stats else None,
+                               caches.get(cache), timeout, steps)
+    except (IndexError, KeyError, ValueError) as error:
+        return {'name': name, 'solved': False, 'seconds': time.perf_counter()-start,
+                'error': 'could not read the board: {}'.format(error)}
+    result = {'name': name, 'solved': current.solved(), 'status': current.status,
+              'seconds': time.perf_counter()-start, 'steps': current.steps, 'solution': current.export()}
+    if not result['solved']:
+        result['partial'] = current.partial()
+    if cache is not None:
+        result['cached'] = caches[cache].hits > hits
+    if stats:
+        result['stats'] = current.stats.summary()['rules']
+    return result
+
+def count_puzzle(name, text, limit=2, timeout=None, steps=None):
+    '''
+    Count the solutions of one puzzle up to limit and return the result as a
+    dict. A count stopped by timeout or steps is never reported as unique.
+    '''
+    start = time.perf_counter()
+    try:
+        current = solver.game(text)
+        current.limit(timeout, steps)
+        found = current.count(limit)
+    except (IndexError, KeyError, ValueError) as error:
+        return {'name': name, 'solved': False, 'seconds': time.perf_counter()-start,
+                'error': 'could not read the board: {}'.format(error)}
+    finished = current.status in ['solved', 'unsolvable']
+    result = {'name': name, 'solved': found > 0, 'status': current.status,
+              'seconds': time.perf_counter()-start, 'steps': current.steps, 'solutions': found,
+              'unique': finished and found == 1, 'solution': current.export()}
+    if not found:
+        result['partial'] = current.partial()
+    return result
+
+def solve_chunk(chunk, method, stats=False, cache=None, count=None, timeout=None, steps=None):
+    '''
+    Solve a list of (name, text) puzzles in one worker.
+    '''
+    return [solve_puzzle(name, text, method, stats, cache, count, timeout, steps) for [name, text] in chunk]
+
+def chunks(puzzles, size):
+    '''
+    Group the puzzles into lists of the given size.
+    '''
+    chunk = []
+    for puzzle in puzzles:
+        chunk.append(puzzle)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def run(puzzles, method='rules', workers=None, chunksize=8, ordered=True, stats=False, cache=None,
+        count=None, timeout=None, steps=None):
+    '''
+    Solve the puzzles on a pool of worker processes and yield each result.
+    Only a few chunks per worker are in flight at once so long streams of
+    puzzles are never all held in memory. With ordered False results are
+    yielded as soon as their chunk finishes. timeout and steps bound each
+    puzzle on its own.
+    '''
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(workers) as executor:
+        limit = 4*workers
+        pending = {} # Futures mapped to the number of their chunk
+        finished = {} # Results of chunks waiting for earlier ones
+        nextchunk = 0
+        submitted = 0
+        source = chunks(puzzles, chunksize)
+        while True:
+            for chunk in source:
+                pending[executor.submit(solve_chunk, chunk, method, stats, cache, count, timeout,
+                                         steps)] = submitted
+                submitted += 1
+                if len(pending) >= limit:
+                    break
+            if not pending:
+                break
+            done = wait(pending, return_when=FIRST_COMPLETED)[0]
+            for future in done:
+                number = pending.pop(future)
+                if ordered:
+                    finished[number] = future.result()
+                else:
+                    yield from future.result()
+            while nextchunk in finished:
+                yield from finished.pop(nextchunk)
+                nextchunk += 1
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('paths', nargs='+', help='board or savefile files, directories or JSONL files')
+    parser.add_argument('--method', choices=['rules', 'exact'], default='rules',
+                        help='how to finish boards propagation can not solve')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: one per core)')
+    parser.add_argument('--chunksize', type=int, default=8,
+                        help='puzzles sent to a worker at a time')
+    parser.add_argument('--as-completed', action='store_true',
+                        help='write results as they finish instead of in input order')
+    parser.add_argument('--stats', metavar='FILE',
+                        help='count the rules of every solve and write the totals to a JSON file')
+    parser.add_argument('--cache', metavar='FILE',
+                        help='SQLite file of solutions to reuse and add to')
+    parser.add_argument('--count', type=int, metavar='LIMIT',
+                        help='count solutions up to LIMIT instead of solving (2 checks uniqueness)')
+    parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                        help='stop each puzzle after this long and report what was found')
+    parser.add_argument('--steps', type=int,
+                        help='stop each puzzle after this many propagation steps')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = 0
+    solved = 0
+    hits = 0
+    unique = 0
+    stopped = 0
+    totals = []
+    for result in run(read_puzzles(args.paths), args.method, args.workers, args.chunksize,
+                      not args.as_completed, args.stats is not None, args.cache, args.count,
+                      args.timeout, args.steps):
+        count += 1
+        solved += result['solved']
+        stopped += result.get('status') in ['timeout', 'steps', 'cancelled']
+        hits += result.get('cached', False)
+        unique += result.get('unique', False)
+        if 'stats' in result:
+            totals.append({'rules': result['stats']})
+        print(json.dumps(result), flush=True)
+    print('Solved {} of {} puzzles in {:.2f}s'.format(solved, count, time.perf_counter()-start),
+          file=sys.stderr)
+    if stopped:
+        print('{} puzzles stopped by --timeout or --steps'.format(stopped), file=sys.stderr)
+    if args.cache is not None and args.count is None:
+        print('Cache: {} hits, {} misses'.format(hits, count-hits), file=sys.stderr)
+    if args.count is not None:
+        print('{} of {} puzzles have a unique solution'.format(unique, count), file=sys.stderr)
+    if args.stats is not None:
+        with open(args.stats, 'w') as stream:
+            json.dump(instrument.merge(totals), stream, indent=1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+#! /usr/bin/env python
+'''
+Time the Galaxies solver on a fixed corpus of puzzles.
+
+Each puzzle is timed phase by phase: parsing, building the game, update_board
+and the search that finishes what propagation leaves. update_board runs
+edge_dots as its first rule, and the edge_dots figure is that rule's time in
+the rule stats of one more run. Results are written as JSON so runs can be
+compared, and --compare reports every puzzle that got slower than a saved run.
+
+The default corpus, benchmark_corpus.jsonl, holds game IDs from 7x7 up to
+150x150 at both difficulties, made by generator.corpus and rebuilt with
+--make-corpus. Every puzzle has exactly one solution. 'dn' puzzles are
+finished by propagation alone, 'du' puzzles need the search.
+'''
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import batch
+import exact_cover
+import generator
+import instrument
+import savefile
+import solver
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_corpus.jsonl')
+PHASES = ['parse', 'construction', 'edge_dots', 'update_board', 'search']
+
+def deductions(current):
+    '''
+    The number of cells with a parent plus the number of borders on the board.
+    '''
+    return int((current.parents >= 0).sum() + current.hborders.sum() + current.vborders.sum())
+
+def run_once(text, method='rules', stats=False):
+    '''
+    Solve the puzzle once. Returns the game, the seconds spent in each phase
+    and the counts the solve produced. Construction includes parsing, which is timed
+    again on its own afterwards. With stats the game counts its rules, which
+    slows it down.
+    '''
+    seconds = {}
+    start = time.perf_counter()
+    current = solver.game(text)
+    seconds['construction'] = time.perf_counter()-start
+    if stats:
+        current.stats = instrument.stats()
+
+    start = time.perf_counter()
+    current.read(text)
+    seconds['parse'] = time.perf_counter()-start
+
+    before = deductions(current)
+    solved = False
+    try:
+        start = time.perf_counter()
+        current.update_board()
+        seconds['update_board'] = time.perf_counter()-start
+        propagated = deductions(current) - before
+        rounds = current.rounds
+
+        start = time.perf_counter()
+        solved = current.solved()
+        if not solved:
+            solved = exact_cover.solve(current) if method == 'exact' else current.search()
+        seconds['search'] = time.perf_counter()-start
+    except solver.contradiction:
+        propagated = deductions(current) - before
+        rounds = current.rounds
+    return current, seconds, {'solved': solved, 'rounds': rounds, 'deductions': propagated}
+
+def measure(name, text, method='rules', repeat=1):
+    '''
+    Benchmark one puzzle. Phase times are the best of repeat runs, the
+    edge_dots time and peak memory come from one more run each, under rule
+    stats and tracemalloc, so neither slows the timed runs.
+    '''
+    best = {}
+    wall = None
+    for attempt in range(repeat):
+        start = time.perf_counter()
+        [current, seconds, counts] = run_once(text, method)
+        elapsed = time.perf_counter()-start
+        wall = elapsed if wall is None else min(wall, elapsed)
+        for phase in seconds:
+            best[phase] = min(best.get(phase, seconds[phase]), seconds[phase])
+
+    counted = run_once(text, method, stats=True)[0].stats.rules
+    if 'edge_dots' in counted:
+        best['edge_dots'] = counted['edge_dots'][1]
+
+    tracemalloc.start()
+    run_once(text, method)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    difficulty = None
+    if savefile.recognise(text):
+        difficulty = savefile.parse_params(savefile.split(text)[0])[2]
+    propagation = best.get('update_board', 0.0)
+    return {'name': name,
+            'size': '{}x{}'.format(current.cols, current.rows),
+            'difficulty': difficulty,
+            'solved': counts['solved'],
+            'wall': wall,
+            'phases': {phase: best[phase] for phase in PHASES if phase in best},
+            'rounds': counts['rounds'],
+            'deductions': counts['deductions'],
+            'deductions_per_second': counts['deductions']/propagation if propagation else None,
+            'peak_memory': peak}
+
+def compare(results, baseline, tolerance=0.25, floor=0.01):
+    '''
+    Returns a line for every puzzle whose wall time grew by more than the
+    tolerance over the baseline run. Differences under floor seconds are
+    treated as noise.
+    '''
+    before = {result['name']: result for result in baseline['results']}
+    slower = []
+    for result in results:
+        old = before.get(result['name'])
+        if old is None:
+            continue
+        if result['wall'] > old['wall']*(1+tolerance) and result['wall'] - old['wall'] > floor:
+            slower.append('{}: {:.3f}s -> {:.3f}s'.format(result['name'], old['wall'], result['wall']))
+        elif old['solved'] and not result['solved']:
+            slower.append('{}: no longer solved'.format(result['name']))
+    return slower
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', default=[CORPUS],
+                        help='board or savefile files, directories or JSONL files (default: the corpus)')
+    parser.add_argument('--method', choices=['rules', 'exact'], default='rules',
+                        help='how to finish boards propagation can not solve')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='runs per puzzle, the best time is kept')
+    parser.add_argument('--output', default='-',
+                        help='file to write the JSON results to (default: stdout)')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='JSON results of an earlier run to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='fraction a puzzle may slow down before it counts as a regression')
+    parser.add_argument('--make-corpus', action='store_true',
+                        help='generate the corpus afresh into benchmark_corpus.jsonl and exit')
+    args = parser.parse_args()
+
+    if args.make_corpus:
+        with open(CORPUS, 'w') as stream:
+            for puzzle in generator.corpus():
+                print(puzzle['name'], file=sys.stderr)
+                stream.write(json.dumps(puzzle) + '\n')
+                stream.flush()
+        return
+
+    results = []
+    for [name, text] in batch.read_puzzles(args.paths):
+        results.append(measure(name, text, args.method, args.repeat))
+        print('{:<16} {:>9} {:>8.3f}s {:>7} rounds {:>10.0f} deductions/s {:>8.1f} MiB'.format(
+            name, results[-1]['size'], results[-1]['wall'], results[-1]['rounds'],
+            results[-1]['deductions_per_second'] or 0, results[-1]['peak_memory']/2**20), file=sys.stderr)
+
+    report = {'python': platform.python_version(),
+              'numpy': np.__version__,
+              'platform': platform.platform(),
+              'method': args.method,
+              'repeat': args.repeat,
+              'wall': sum(result['wall'] for result in results),
+              'results': results}
+    if args.output == '-':
+        print(json.dumps(report, indent=1))
+    else:
+        with open(args.output, 'w') as stream:
+            json.dump(report, stream, indent=1)
+    print('{} puzzles in {:.2f}s'.format(len(results), report['wall']), file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as stream:
+            slower = compare(results, json.load(stream), args.tolerance)
+        for line in slower:
+            print('Regression', line, file=sys.stderr)
+        if slower:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
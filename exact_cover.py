@@ -0,0 +1,177 @@
+#! /usr/bin/env python
+'''
+An exact cover backend for the Galaxies solver.
+
+Every galaxy is modelled as a set of options, one for each pair of cells that
+mirror each other across its dot. A solution picks options so every cell is
+covered exactly once, and each galaxy's cells stay connected to its dot.
+The options are searched with Knuth's Algorithm X over dicts of sets, which
+behaves like Dancing Links without the pointer juggling. Each galaxy keeps
+the cells it covers and a count of its options on every cell, so a choice
+only floods the galaxies it grew or cut off from a cell. The flood drops the
+options a galaxy can no longer join up with, which keeps the search small.
+'''
+
+def build(game):
+    '''
+    Returns the columns, options, forced options, reach and neighbours for a
+    board whose groups have been built by update_board. Columns map each cell
+    index to the set of options still covering it, options map (galaxy id,
+    cell index) to the cell indices they cover. reach maps each galaxy id to
+    the number of its options on every cell, and neighbours lists the cells
+    each cell can share a galaxy with.
+    '''
+    columns = {each.index: set() for each in game.cells}
+    options = {}
+    forced = set()
+    reach = {dot.id: {} for dot in game.dots}
+    for dot in game.dots:
+        counts = reach[dot.id]
+        for each in dot.group:
+            twin = dot.mirror(each)
+            key = (dot.id, min(each.index, twin.index))
+            if key not in options:
+                options[key] = sorted({each.index, twin.index})
+                for index in options[key]:
+                    columns[index].add(key)
+                    counts[index] = counts.get(index, 0) + 1
+            if game.parents[each.index] == dot.id:
+                forced.add(key)
+    # Walls are fixed while the cover is searched, so the links are read once
+    neighbours = [[other.index for [wall, other] in each.links if other is not None and not wall.border]
+                  for each in game.cells]
+    return columns, options, forced, reach, neighbours
+
+def select(columns, options, reach, key):
+    '''
+    Cover every cell of the option and remove each option that clashes with
+    it. Returns the removed columns and the ids of the galaxies left with no
+    option on some cell.
+    '''
+    removed = []
+    shrunk = set()
+    for index in options[key]:
+        for other in columns[index]:
+            for shared in options[other]:
+                if shared != index:
+                    columns[shared].discard(other)
+            if other != key:
+                counts = reach[other[0]]
+                for shared in options[other]:
+                    counts[shared] -= 1
+                    if not counts[shared]:
+                        shrunk.add(other[0])
+        removed.append(columns.pop(index))
+    return removed, shrunk
+
+def deselect(columns, options, reach, key, removed):
+    '''
+    Undo select.
+    '''
+    for index in reversed(options[key]):
+        columns[index] = removed.pop()
+        for other in columns[index]:
+            for shared in options[other]:
+                if shared != index:
+                    columns[shared].add(other)
+            if other != key:
+                counts = reach[other[0]]
+                for shared in options[other]:
+                    counts[shared] += 1
+
+def trim(columns, options, neighbours, counts, covered, id, pruned):
+    '''
+    Flood the galaxy from the cells it covers through the cells it has
+    options on, counts, and remove its options on cells the flood can not
+    reach, appending them to pruned. Returns False if the covered cells can
+    no longer be joined up.
+    '''
+    while covered:
+        start = next(iter(covered))
+        seen = {start}
+        queue = [start]
+        for index in queue:
+            for other in neighbours[index]:
+                if other not in seen and counts.get(other):
+                    seen.add(other)
+                    queue.append(other)
+        if not covered <= seen:
+            return False
+        cut = [index for index in counts if counts[index] and index not in seen]
+        if not cut:
+            break
+        # Removing an option can strand its twin cell, so flood again
+        for index in cut:
+            for key in [key for key in columns[index] if key[0] == id]:
+                for shared in options[key]:
+                    columns[shared].discard(key)
+                    counts[shared] -= 1
+                pruned.append(key)
+    return True
+
+def restore(columns, options, reach, pruned):
+    '''
+    Undo trim.
+    '''
+    for key in reversed(pruned):
+        counts = reach[key[0]]
+        for shared in options[key]:
+            columns[shared].add(key)
+            counts[shared] += 1
+    pruned.clear()
+
+def solve(game):
+    '''
+    Solve the board by exact cover and write the answer back into the game.
+    The game's groups must have been built by update_board. Returns True if a
+    solution was found. Every option tried is a step of the game's budget, so
+    its limits can stop the search with solver.stopped.
+    '''
+    [columns, options, forced, reach, neighbours] = build(game)
+    covered = {id: set() for id in reach} # Cells covered by each galaxy
+    solution = []
+
+    # Options holding cells that are already known are taken up front
+    for key in sorted(forced):
+        if any(index not in columns for index in options[key]):
+            return False
+        select(columns, options, reach, key)
+        covered[key[0]].update(options[key])
+        solution.append(key)
+    if not all(trim(columns, options, neighbours, reach[id], covered[id], id, []) for id in reach):
+        return False
+
+    frames = [] # [options still to try, option taken, removed columns, pruned options] per choice
+    while columns:
+        index = min(columns, key=lambda index: len(columns[index]))
+        frames.append([sorted(columns[index], reverse=True), None, None, []])
+        while frames:
+            frame = frames[-1]
+            if frame[1] is not None: # Take back the previous attempt
+                restore(columns, options, reach, frame[3])
+                deselect(columns, options, reach, frame[1], frame[2])
+                covered[frame[1][0]].difference_update(options[frame[1]])
+                solution.pop()
+                frame[1] = None
+            if not frame[0]:
+                frames.pop()
+                continue
+            key = frame[0].pop()
+            game.tick()
+            [removed, shrunk] = select(columns, options, reach, key)
+            covered[key[0]].update(options[key])
+            solution.append(key)
+            [frame[1], frame[2]] = [key, removed]
+            # Only galaxies that grew or lost a cell can have come apart
+            shrunk.add(key[0])
+            if all(trim(columns, options, neighbours, reach[id], covered[id], id, frame[3]) for id in shrunk):
+                break
+        else:
+            return False
+
+    for key in solution:
+        for index in options[key]:
+            if game.parents[index] < 0:
+                game.cells[index].set_parent(key[0])
+    game.update_board()
+    return True
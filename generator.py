@@ -0,0 +1,315 @@
+#! /usr/bin/env python
+'''
+Generate random Galaxies puzzles with known solutions.
+
+Galaxies are grown one at a time from a random free cell. The dot goes in the
+cell, on one of its edges or on one of its corners. The galaxy then grows by
+adding pairs of free cells that mirror each other across the dot, so every
+galaxy is symmetric and connected by construction. One cell galaxies left in
+the gaps are then taken in by their neighbours where symmetry allows, as edge
+dots give them away for free. Generation is seeded and the same seed always
+gives the same puzzles.
+
+Layouts with more than one solution are repaired rather than thrown away. Two
+solutions are found with game.count, and a cell where they disagree is cut out
+of its galaxy, together with its twin and whatever that cuts off from the dot.
+New galaxies are grown over the freed cells. The intended solution still fits
+and the two found no longer do, as neither has a galaxy for the new dots, and
+this repeats until only one solution is left. Sparse layouts can take the
+search far too long to count, so once a count runs past BUDGET steps the
+galaxies of cells that propagation left open are split up instead, much as
+Tatham's generator adds clues until its solver finishes.
+'''
+
+import argparse
+import json
+import random
+import sys
+import savefile
+import solver
+
+STEPS = [[-1, 0], [1, 0], [0, -1], [0, 1]]
+BUDGET = 20000 # Propagation steps a uniqueness check may take before more dots are added
+SIZES = [7, 10, 15, 20, 30, 50, 100, 150] # Sides of the benchmark corpus boards
+
+def grow(owner, dots, row, col, rng, maxsize=8):
+    '''
+    Start a galaxy at the free cell and grow it into free cells, which are
+    those owner gives no galaxy. Its dot is added to dots and its cells are
+    marked in owner.
+    '''
+    [height, width] = [len(owner), len(owner[0])]
+    free = lambda row, col: 0 <= row < height and 0 <= col < width and owner[row][col] < 0
+    # The dot sits in the cell, on its east or south edge or its south east corner
+    starts = [[[row, col]]]
+    if free(row, col+1):
+        starts.append([[row, col], [row, col+1]])
+    if free(row+1, col):
+        starts.append([[row, col], [row+1, col]])
+    if free(row, col+1) and free(row+1, col) and free(row+1, col+1):
+        starts.append([[row, col], [row, col+1], [row+1, col], [row+1, col+1]])
+    region = rng.choice(starts)
+    id = len(dots)
+    dotrow = sum(2*cellrow+1 for [cellrow, cellcol] in region)//len(region)
+    dotcol = sum(2*cellcol+1 for [cellrow, cellcol] in region)//len(region)
+    dots.append([dotrow, dotcol])
+    for [cellrow, cellcol] in region:
+        owner[cellrow][cellcol] = id
+
+    # Grow into random neighbours of the galaxy until it is big enough
+    # or has no room left
+    size = rng.randint(1, maxsize)
+    edge = [[cellrow+rowstep, cellcol+colstep] for [cellrow, cellcol] in region for [rowstep, colstep] in STEPS]
+    while len(region) < size and edge:
+        [cellrow, cellcol] = edge.pop(rng.randrange(len(edge)))
+        [twinrow, twincol] = [dotrow-cellrow-1, dotcol-cellcol-1]
+        if free(cellrow, cellcol) and free(twinrow, twincol):
+            owner[cellrow][cellcol] = owner[twinrow][twincol] = id
+            added = [[cellrow, cellcol]] if [twinrow, twincol] == [cellrow, cellcol] else \
+                    [[cellrow, cellcol], [twinrow, twincol]]
+            region.extend(added)
+            edge.extend([addedrow+rowstep, addedcol+colstep]
+                        for [addedrow, addedcol] in added for [rowstep, colstep] in STEPS)
+
+def generate(width, height, seed=None, maxsize=8):
+    '''
+    Returns the dots and the solution of a random puzzle of width by height
+    cells. Dots are [row, col] board coordinates and the solution is the
+    galaxy id of every cell as a list of rows. Galaxies hold up to maxsize
+    cells, plus one if a pair overshoots.
+    '''
+    rng = random.Random(seed)
+    owner = [[-1]*width for row in range(height)]
+    dots = []
+    order = [[row, col] for row in range(height) for col in range(width)]
+    rng.shuffle(order)
+    for [row, col] in order:
+        if owner[row][col] < 0:
+            grow(owner, dots, row, col, rng, maxsize)
+    return absorb(dots, owner)
+
+def absorb(dots, owner):
+    '''
+    Growth leaves many one cell galaxies in the gaps between the others, and
+    edge_dots gives those away. A galaxy next to such a cell takes it in,
+    along with its twin across the dot if that is a one cell galaxy too, until
+    no galaxy can. Returns the dots that are left and owner renumbered for
+    them.
+    '''
+    [height, width] = [len(owner), len(owner[0])]
+    sizes = [0]*len(dots)
+    for cells in owner:
+        for id in cells:
+            sizes[id] += 1
+    changed = True
+    while changed:
+        changed = False
+        for [row, col] in [[row, col] for row in range(height) for col in range(width)]:
+            if sizes[owner[row][col]] != 1:
+                continue
+            for [rowstep, colstep] in STEPS:
+                if not (0 <= row+rowstep < height and 0 <= col+colstep < width):
+                    continue
+                other = owner[row+rowstep][col+colstep]
+                [twinrow, twincol] = [dots[other][0]-row-1, dots[other][1]-col-1]
+                if 0 <= twinrow < height and 0 <= twincol < width and sizes[owner[twinrow][twincol]] == 1 \
+                        and [twinrow, twincol] != [row, col]:
+                    for [cellrow, cellcol] in [[row, col], [twinrow, twincol]]:
+                        sizes[owner[cellrow][cellcol]] = 0
+                        owner[cellrow][cellcol] = other
+                    sizes[other] += 2
+                    changed = True
+                    break
+    kept = [id for id in range(len(dots)) if sizes[id]]
+    renumber = {id: number for [number, id] in enumerate(kept)}
+    for cells in owner:
+        for col in range(width):
+            cells[col] = renumber[cells[col]]
+    return [dots[id] for id in kept], owner
+
+def ascii(width, height, dots, owner=None):
+    '''
+    Returns the puzzle as an ascii board in the format import_clean reads.
+    With an owner list of rows the borders of that solution are drawn in.
+    '''
+    board = [['+' if row%2==0 and col%2==0 else ' ' for col in range(2*width+1)]
+             for row in range(2*height+1)]
+    for col in range(1, 2*width, 2):
+        board[0][col] = board[2*height][col] = '-'
+    for row in range(1, 2*height, 2):
+        board[row][0] = board[row][2*width] = '|'
+    if owner is not None:
+        for row in range(height):
+            for col in range(width):
+                if row+1 < height and owner[row][col] != owner[row+1][col]:
+                    board[2*row+2][2*col+1] = '-'
+                if col+1 < width and owner[row][col] != owner[row][col+1]:
+                    board[2*row+1][2*col+2] = '|'
+    for [row, col] in dots:
+        board[row][col] = 'o'
+    return ''.join(''.join(line) + '\n' for line in board)
+
+def split(dots, owner, cell, rng, maxsize=8):
+    '''
+    Cut the cell and its twin out of their galaxy, along with any of the
+    galaxy that is then cut off from its dot, and grow new galaxies over the
+    freed cells starting from the cell. A cell touching the dot frees the
+    whole galaxy. Every galaxy stays symmetric and connected, so owner stays
+    a solution, and no solution of the old dots fits the new ones. Changes
+    dots and owner in place.
+    '''
+    [row, col] = cell
+    id = owner[row][col]
+    [dotrow, dotcol] = dots[id]
+    region = [[cellrow, cellcol] for cellrow in range(len(owner)) for cellcol in range(len(owner[0]))
+              if owner[cellrow][cellcol] == id]
+    centre = [[cellrow, cellcol] for [cellrow, cellcol] in region
+              if abs(2*cellrow+1-dotrow) <= 1 and abs(2*cellcol+1-dotcol) <= 1]
+    # What is left of the galaxy is whatever can still reach the dot
+    reached = set()
+    if [row, col] not in centre:
+        left = {(cellrow, cellcol) for [cellrow, cellcol] in region} - {(row, col), (dotrow-row-1, dotcol-col-1)}
+        reached = {(cellrow, cellcol) for [cellrow, cellcol] in centre}
+        stack = list(reached)
+        while stack:
+            [cellrow, cellcol] = stack.pop()
+            for [rowstep, colstep] in STEPS:
+                other = (cellrow+rowstep, cellcol+colstep)
+                if other in left and other not in reached:
+                    reached.add(other)
+                    stack.append(other)
+    freed = [[row, col]] + [[cellrow, cellcol] for [cellrow, cellcol] in region
+                            if (cellrow, cellcol) not in reached and [cellrow, cellcol] != [row, col]]
+    for [cellrow, cellcol] in freed:
+        owner[cellrow][cellcol] = -1
+    for [cellrow, cellcol] in freed:
+        if owner[cellrow][cellcol] < 0:
+            grow(owner, dots, cellrow, cellcol, rng, maxsize)
+    if not reached: # The galaxy's own dot is gone, so the last galaxy takes its id
+        last = len(dots)-1
+        for cells in owner:
+            for cellcol in range(len(cells)):
+                if cells[cellcol] == last:
+                    cells[cellcol] = id
+        dots[id] = dots.pop()
+
+def groups(width, indices):
+    '''
+    Returns the cell indices split into groups of cells that touch.
+    '''
+    left = set(indices)
+    found = []
+    for index in indices:
+        if index not in left:
+            continue
+        left.discard(index)
+        group = [index]
+        for each in group:
+            [row, col] = divmod(each, width)
+            for [rowstep, colstep] in STEPS:
+                other = (row+rowstep)*width + col+colstep
+                if 0 <= col+colstep < width and other in left:
+                    left.discard(other)
+                    group.append(other)
+        found.append(group)
+    return found
+
+def disambiguate(width, height, dots, owner, rng, maxsize=8, steps=BUDGET):
+    '''
+    Add dots until owner is the only solution, changing dots and owner in
+    place. rng and maxsize grow the galaxies that replace the ones split up.
+    Every round splits up the galaxy of one cell in every group of cells where the
+    two solutions found disagree, ruling out at least one of them. When the
+    search takes more than steps propagation steps to count them, one cell in
+    every group propagation left open is split off instead.
+    '''
+    while True:
+        current = solver.game(savefile.game_id(width, height, dots))
+        current.update_board() # Owner fits, so this never meets a contradiction
+        if current.solved():
+            return
+        stuck = [each.index for each in current.cells if current.parents[each.index] < 0]
+        current.limit(steps=steps)
+        found = []
+        if current.count(2, found) >= 2:
+            # Prefer cells where neither solution matches owner, to rule out both
+            coords = [[tuple(current.dots[id].coords) for id in parents] for parents in found]
+            differ = [index for index in range(width*height) if coords[0][index] != coords[1][index]]
+            wrong = lambda index: sum(tuple(dots[owner[index//width][index%width]]) != each[index] for each in coords)
+            cells = [max(group, key=wrong) for group in groups(width, differ)]
+        elif current.status == 'steps':
+            cells = [group[len(group)//2] for group in groups(width, stuck)]
+        else:
+            return
+        for index in cells:
+            split(dots, owner, divmod(index, width), rng, maxsize)
+
+def puzzles(width, height, seed=None, number=1, maxsize=8, check=False):
+    '''
+    Yields number (dots, owner) puzzles. Each puzzle gets its own seed drawn
+    from seed. With check, layouts without a unique solution have dots added
+    until they have one.
+    '''
+    rng = random.Random(seed)
+    for puzzle in range(number):
+        seed = rng.getrandbits(64)
+        [dots, owner] = generate(width, height, seed, maxsize)
+        if check:
+            disambiguate(width, height, dots, owner, random.Random(seed+1), maxsize)
+        yield dots, owner
+
+def difficulty(width, height, dots):
+    '''
+    Returns 'n' if propagation alone finishes the puzzle and 'u' if it needs
+    the search. Tatham's letters are borrowed to describe this solver.
+    '''
+    current = solver.game(savefile.game_id(width, height, dots))
+    current.update_board()
+    return 'n' if current.solved() else 'u'
+
+def corpus(sizes=SIZES, number=2, seed=0):
+    '''
+    Yields number unique square puzzles for each size and difficulty, as
+    JSONL objects named like '30x30du-1'. 'u' puzzles are grown with larger
+    galaxies, which propagation finishes less often.
+    '''
+    rng = random.Random(seed)
+    for size in sizes:
+        for [level, maxsize] in [['n', 8], ['u', 16]]:
+            found = 0
+            while found < number:
+                for [dots, owner] in puzzles(size, size, rng.getrandbits(64), 1, maxsize, check=True):
+                    if difficulty(size, size, dots) == level:
+                        found += 1
+                        yield {'name': '{0}x{0}d{1}-{2}'.format(size, level, found),
+                               'board': savefile.game_id(size, size, dots, level)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('width', type=int, help='columns of cells')
+    parser.add_argument('height', type=int, help='rows of cells')
+    parser.add_argument('--seed', type=int, default=None, help='seed for reproducible puzzles')
+    parser.add_argument('--number', type=int, default=1, help='how many puzzles to make')
+    parser.add_argument('--max-size', type=int, default=8, help='most cells in a galaxy')
+    parser.add_argument('--unique', action='store_true',
+                        help='add dots until every puzzle has exactly one solution')
+    parser.add_argument('--format', choices=['ascii', 'savefile', 'id', 'jsonl'], default='ascii',
+                        help='jsonl writes one object per puzzle with its game ID and solution')
+    args = parser.parse_args()
+
+    level = 'u' # Puzzles may need guessing, Tatham's hardest setting
+    for [number, [dots, owner]] in enumerate(puzzles(args.width, args.height, args.seed, args.number,
+                                                      args.max_size, args.unique)):
+        if args.format == 'ascii':
+            sys.stdout.write(('\n' if number else '') + ascii(args.width, args.height, dots))
+        elif args.format == 'savefile':
+            sys.stdout.write(savefile.write(args.width, args.height, dots, level))
+        elif args.format == 'id':
+            print(savefile.game_id(args.width, args.height, dots, level))
+        else:
+            print(json.dumps({'name': '{}x{}-{}'.format(args.width, args.height, number),
+                              'board': savefile.game_id(args.width, args.height, dots, level),
+                              'solution': ascii(args.width, args.height, dots, owner)}))
+
+if __name__ == '__main__':
+    main()
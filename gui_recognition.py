@@ -1,10 +1,23 @@
 #! /usr/bin/env python
 '''
 A tool to solve Galaxies puzzles as implemented by Simon Tatham's Collection.
+
+Puzzles are read off a single image of the game window, either a screenshot
+file or a fresh capture of the screen. The board is the largest rectangle
+drawn in the BORDER colour. Inside it the GRID coloured gridlines give the
+size of the board and where every cell, edge and corner is, and the dots are
+found by looking at those places for WHITE, or BORDER for black dots. All of
+this is done with numpy on the whole image at once, so no display is needed
+unless the screen itself is captured.
 '''
 
-import os
-import pyautogui
+import argparse
+import io
+import sys
+import numpy as np
+from PIL import Image
+import generator
+import savefile
 
 #Colors of board
 BACKGROUND = (213, 211, 206)
@@ -12,71 +25,239 @@ BORDER = (0, 0, 0)
 GRID = (170, 169, 165)
 WHITE = (255, 255, 255)
 
-def find_board():
-    '''
-    Returns a tuple of the game board region. (top, left, width, height)
-    '''
-    title = pyautogui.locateOnScreen('title.png')
-    if title == None:
-        title = pyautogui.locateOnScreen('title_active.png')
-    screenshot = pyautogui.screenshot()
-    border = [(title[0]+30), (title[1]+title[3]+1), 0, 0]
-    while screenshot.getpixel((border[0], border[1])) != BACKGROUND:
-        border[1] += 1
-    while screenshot.getpixel((border[0], border[1])) != BORDER:
-        border[1] += 1
-    while screenshot.getpixel((border[0]-1, border[1])) == BORDER:
-        border[0] -= 1
-    while screenshot.getpixel((border[0]+border[2], border[1])) == BORDER:
-        border[2] += 1
-    while screenshot.getpixel((border[0], border[1]+border[3])) == BORDER:
-        border[3] += 1
-    return tuple(border)
-
-def color_width(measure_start):
-    screenshot = pyautogui.screenshot()
-    width = 0
-    start_color = screenshot.getpixel((measure_start))
-    while screenshot.getpixel((measure_start[0] + width, measure_start[1])) == start_color:
-        width += 1
-    return width
-
-def color_height(measure_start):
-    screenshot = pyautogui.screenshot()
-    height = 0
-    start_color = screenshot.getpixel((measure_start))
-    while screenshot.getpixel((measure_start[0] + height, measure_start[1])) == start_color:
-        height += 1
-    return height
-
-def define_board_style():
+layouts = {} # The last board layout found in frames of each size
+
+def load(image):
+    '''
+    Returns an image as an array of RGB pixels. The image can be a path, the
+    bytes of an image file, an open file, a PIL image or an array already.
+    '''
+    if isinstance(image, np.ndarray):
+        return image[..., :3]
+    if isinstance(image, (bytes, bytearray)):
+        image = io.BytesIO(image)
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    return np.asarray(image.convert('RGB'))
+
+def capture(region=None):
+    '''
+    Returns a screenshot of the screen, or of the (left, top, width, height)
+    region of it, as an array of RGB pixels.
+    '''
+    import pyautogui # Only needed for the live screen, so images can be read headless
+    return load(pyautogui.screenshot(region=region))
+
+def mask(frame, color):
+    '''
+    True at every pixel of the frame that is exactly color.
+    '''
+    found = frame[..., 0] == color[0]
+    found &= frame[..., 1] == color[1]
+    found &= frame[..., 2] == color[2]
+    return found
+
+def runs(mask):
+    '''
+    Returns the column, first row and length of every vertical run of True in
+    mask.
+    '''
+    # Columns laid end to end, each after a False pixel that parts its runs
+    # from the last column's
+    length = mask.shape[0]+1
+    flat = np.zeros(mask.shape[1]*length+1, dtype=bool)
+    flat[:-1].reshape(mask.shape[1], length)[:, 1:] = mask.T
+    edges = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    [starts, ends] = [edges[::2], edges[1::2]]
+    return starts//length, starts%length-1, ends-starts
+
+def bands(indices):
+    '''
+    Splits sorted indices into lists of consecutive ones.
+    '''
+    return np.split(indices, np.nonzero(np.diff(indices) > 1)[0] + 1) if len(indices) else []
+
+def find_border(frame):
+    '''
+    Returns the (left, top, width, height) region of the board, border
+    included, and the thickness of the border. The left and right sides of
+    the border are the longest vertical lines of BORDER pixels in the frame.
+    '''
+    [cols, starts, lengths] = runs(mask(frame, BORDER))
+    if not len(lengths):
+        raise ValueError('no Galaxies board found')
+    longest = lengths.max()
+    sides = bands(np.unique(cols[lengths == longest]))
+    if len(sides) != 2 or len(sides[0]) != len(sides[1]):
+        raise ValueError('no Galaxies board found')
+    [left, right] = [sides[0][0], sides[1][-1]]
+    top = starts[lengths == longest].min()
+    return (int(left), int(top), int(right-left+1), int(longest)), len(sides[0])
+
+def gridlines(profile, length):
+    '''
+    Returns the pixel of every board coordinate along one side of the board,
+    from the outside of the border at 0 to the other side at 2*cells, given
+    how many GRID pixels each row or column inside the border holds. Gridlines
+    are the peaks of the profile. The outer cells are partly under the border,
+    so the two outside edges are placed a gridline spacing past the outermost
+    gridlines.
+    '''
+    lines = np.array([band.mean() for band in bands(np.nonzero(profile > profile.max()/2)[0])])
+    if not profile.any() or not len(lines):
+        raise ValueError('no gridlines found')
+    pitch = np.median(np.diff(lines)) if len(lines) > 1 else length/2
+    edges = np.concatenate([[lines[0]-pitch], lines, [lines[-1]+pitch]])
+    positions = np.empty(2*len(edges)-1)
+    positions[::2] = edges
+    positions[1::2] = (edges[:-1]+edges[1:])/2
+    return positions, pitch
+
+def find_layout(frame):
+    '''
+    Returns the board region and border thickness, as find_border does, then
+    the pixel row of every board row and the pixel column of every board
+    column, counted from the top left of the frame, and the distance between
+    gridlines. The gridlines come from one histogram of GRID pixels over the
+    rows inside the border and one over the columns.
+    '''
+    [[left, top, width, height], thickness] = find_border(frame)
+    inside = mask(frame[top+thickness:top+height-thickness, left+thickness:left+width-thickness], GRID)
+    [rows, rowpitch] = gridlines(inside.sum(axis=1), inside.shape[0])
+    [cols, colpitch] = gridlines(inside.sum(axis=0), inside.shape[1])
+    return (left, top, width, height), thickness, rows+top+thickness, cols+left+thickness, \
+           (rowpitch+colpitch)/2
+
+def unchanged(frame, box, thickness, rows, cols, pitch):
+    '''
+    True if a layout found earlier still fits the frame: the border is where
+    it was and every gridline holds more GRID pixels than any line through
+    the middle of a row or column of cells.
+    '''
+    [left, top, width, height] = box
+    if frame.shape[0] < top+height or frame.shape[1] < left+width:
+        return False
+    board = frame[top:top+height, left:left+width]
+    sides = [board[:, :thickness], board[:, -thickness:], board[:thickness], board[-thickness:]]
+    if not all(mask(side, BORDER).all() for side in sides):
+        return False
+    inside = board[thickness:-thickness, thickness:-thickness]
+    for [positions, offset, axis] in [[rows, top, 0], [cols, left, 1]]:
+        pixels = np.rint(positions[1:-1]).astype(int) - offset - thickness
+        profile = mask(np.take(inside, pixels, axis=axis), GRID).sum(axis=1-axis)
+        if len(profile) > 1 and profile[1::2].min() <= profile[::2].max():
+            return False
+    return True
+
+def layout(frame):
+    '''
+    Returns the pixel rows and columns of the board coordinates and the
+    distance between gridlines, as find_layout does. The layout is kept for
+    every size of frame, so repeated captures of the same game window only
+    check that the board has not moved or changed size.
+    '''
+    found = layouts.get(frame.shape[:2])
+    if found is None or not unchanged(frame, *found):
+        found = layouts[frame.shape[:2]] = find_layout(frame)
+    return found[2:]
+
+def find_dots(frame, rows, cols, pitch):
+    '''
+    Returns the [row, col] board coordinates of every dot. A dot is WHITE, or
+    BORDER for a black dot, at its position and at four points around it,
+    which keeps the borders drawn by a player from passing for black dots.
+    '''
+    inside = [rows[1:-1], cols[1:-1]] # Dots never sit on the outer border
+    near = pitch/8
+    dots = np.zeros((len(inside[0]), len(inside[1])), dtype=bool)
+    for color in [WHITE, BORDER]:
+        found = np.ones_like(dots)
+        for [down, across] in [[0, 0], [-near, -near], [-near, near], [near, -near], [near, near]]:
+            pixels = np.ix_(np.clip(np.rint(inside[0]+down).astype(int), 0, frame.shape[0]-1),
+                            np.clip(np.rint(inside[1]+across).astype(int), 0, frame.shape[1]-1))
+            found &= mask(frame[pixels], color)
+        dots |= found
+    return [[int(row)+1, int(col)+1] for [row, col] in np.argwhere(dots)]
+
+def read(image):
+    '''
+    Returns the width and height in cells and the dot coordinates of the
+    puzzle in an image of the game, as savefile.read does for game IDs.
+    '''
+    frame = load(image)
+    [rows, cols, pitch] = layout(frame)
+    return (len(cols)-1)//2, (len(rows)-1)//2, find_dots(frame, rows, cols, pitch)
+
+def find_board(frame=None):
+    '''
+    Returns a tuple of the game board region. (left, top, width, height)
+    '''
+    return find_border(capture() if frame is None else frame)[0]
+
+def color_width(frame, measure_start):
+    '''
+    The number of pixels right of measure_start, itself included, that share
+    its color.
+    '''
+    [x, y] = [int(value) for value in measure_start]
+    line = frame[y, x:]
+    changes = np.nonzero((line != line[0]).any(axis=-1))[0]
+    return int(changes[0]) if len(changes) else len(line)
+
+def color_height(frame, measure_start):
+    '''
+    The number of pixels below measure_start, itself included, that share its
+    color.
+    '''
+    [x, y] = [int(value) for value in measure_start]
+    line = frame[y:, x]
+    changes = np.nonzero((line != line[0]).any(axis=-1))[0]
+    return int(changes[0]) if len(changes) else len(line)
+
+def define_board_style(frame=None):
     global gameboard
     global border_thickness
     global outer_cell_size
     global gridline_thickness
     global inner_cell_size
-    gameboard = find_board()
-    border_thickness = color_width((gameboard[0], (gameboard[1] + (gameboard[3]/2))))
-    outer_cell_size = color_width((gameboard[0]+border_thickness,
-                                  gameboard[1]+border_thickness))
-    gridline_thickness = color_width((gameboard[0]+border_thickness+outer_cell_size,
-                                     gameboard[1]+border_thickness))
-    inner_cell_size = color_width((gameboard[0]+border_thickness+
-                                  outer_cell_size+gridline_thickness,
-                                  gameboard[1]+border_thickness))
+    if frame is None:
+        frame = capture()
+    gameboard = find_board(frame)
+    border_thickness = color_width(frame, (gameboard[0], (gameboard[1] + (gameboard[3]/2))))
+    outer_cell_size = color_width(frame, (gameboard[0]+border_thickness,
+                                          gameboard[1]+border_thickness))
+    gridline_thickness = color_width(frame, (gameboard[0]+border_thickness+outer_cell_size,
+                                             gameboard[1]+border_thickness))
+    inner_cell_size = color_width(frame, (gameboard[0]+border_thickness+
+                                          outer_cell_size+gridline_thickness,
+                                          gameboard[1]+border_thickness))
     print("Gameboard region: ", gameboard)
     print("Border: ", border_thickness)
     print("Gridline: ", gridline_thickness)
     print("Inner cell: ", inner_cell_size)
 
-def grid_size():
-    x_gridlines = list(pyautogui.locateAllOnScreen('x_gridline.png', region=gameboard))
-    y_gridlines = list(pyautogui.locateAllOnScreen('y_gridline.png', region=gameboard))
-    return (len(x_gridlines), len(y_gridlines))
+def grid_size(frame=None):
+    '''
+    Returns the number of columns and rows of cells on the board.
+    '''
+    [rows, cols] = layout(capture() if frame is None else frame)[:2]
+    return ((len(cols)-1)//2, (len(rows)-1)//2)
 
 def main():
-    define_board_style()
-    (x_cells, y_cells) = grid_size()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('image', nargs='?',
+                        help='screenshot of the game (default: capture the screen)')
+    parser.add_argument('--format', choices=['id', 'ascii', 'savefile'], default='id',
+                        help='how to write the puzzle, all of which solver.py reads')
+    args = parser.parse_args()
+
+    [width, height, dots] = read(capture() if args.image is None else args.image)
+    if args.format == 'id':
+        print(savefile.game_id(width, height, dots))
+    elif args.format == 'ascii':
+        sys.stdout.write(generator.ascii(width, height, dots))
+    else:
+        sys.stdout.write(savefile.write(width, height, dots))
 
 if __name__ == '__main__':
     main()
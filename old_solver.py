@@ -4,6 +4,7 @@ A tool to solve Galaxies puzzles as implemented by Simon Tatham's Collection.
 '''
 
 import os
+import time
 import pyperclip
 
 def startup(board, dotlist):
@@ -536,16 +537,27 @@ def assign_cells(board):
                         update_cells(cellrow, cellcol)
     return board
 
-def main():
+def main(timeout=None, rounds=None):
+    '''
+    Solve the board on the clipboard. timeout in seconds and rounds bound the
+    main loop, and the board is printed as far as it got if either runs out.
+    '''
     global board
     global dotlist
     board = import_text()
     dotlist = []
+    deadline = None if timeout is None else time.monotonic()+timeout
 
     startup(board, dotlist)
 
     # while dotlist:
+    count = 0
     while True:
+        count += 1
+        if (rounds is not None and count > rounds) or (deadline is not None and time.monotonic() >= deadline):
+            print('STOPPED after {} rounds'.format(count-1))
+            print_table(board)
+            return board
         previous = [row[:] for row in board]
         board = check_parents(board)
         print_table(board)
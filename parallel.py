@@ -0,0 +1,168 @@
+#! /usr/bin/env python
+'''
+Search a single hard Galaxies puzzle on several cores at once.
+
+Propagation runs first, then the top of the branch tree is expanded a level
+at a time until there are a few open subproblems per worker. Each subproblem is
+sent to a pool of worker processes as the compact bytes of game.state, and
+every worker searches its own subtree. There are more subproblems than
+workers, so a worker that finishes early takes the next one from the pool's
+queue. The first solution found sets a shared event that every other worker
+sees as its game's cancel token.
+'''
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+import solver
+
+games = {} # The game of this worker process, by puzzle text, reused for every subproblem
+cancel = None # The event that stops this worker once another has found a solution
+
+def start(event):
+    '''
+    Runs once in every worker process as it starts.
+    '''
+    global cancel
+    cancel = event
+
+def explore(text, state):
+    '''
+    Search the subproblem in state. Returns the state of the first solution
+    found, or None if there is none or another worker got there first.
+    '''
+    if text not in games:
+        games.clear()
+        games[text] = solver.game(text)
+    current = games[text]
+    current.restore(state)
+    current.limit(cancel=cancel)
+    try:
+        for solution in current.explore():
+            return current.state()
+    except solver.stopped:
+        pass
+    return None
+
+def leaves(current, depth, states):
+    '''
+    Add the state of every open node depth guesses below the game's current
+    board to states. Every guess is undone through the trail afterwards.
+    Returns the state of a solution instead if one turns up on the way.
+    '''
+    if current.solved():
+        return current.state()
+    if depth == 0:
+        states.append(current.state())
+        return None
+    each = current.branch_cell()
+    mark = len(current.trail)
+    for id in sorted(current.candidates[each.index]):
+        try:
+            each.set_parent(id)
+            current.update_board()
+            solution = leaves(current, depth-1, states)
+        except solver.contradiction:
+            current.abandon()
+            solution = None
+        current.undo(mark)
+        if solution is not None:
+            return solution
+    return None
+
+def split(current, count):
+    '''
+    Expand the branch tree of a propagated game one level deeper at a time
+    until there are at least count open subproblems or the tree runs out.
+    Returns the states of the subproblems, and the state of a solution if one
+    turned up on the way. The game is left where it started.
+    '''
+    current.trail = []
+    depth = 0
+    states = [None]
+    while 0 < len(states) < count:
+        depth += 1
+        states = []
+        solution = leaves(current, depth, states)
+        if solution is not None:
+            states = []
+            break
+    current.trail = None
+    return states, solution
+
+def solve(text=None, workers=None, split_factor=4, timeout=None):
+    '''
+    Solve a puzzle with the search spread over workers processes and return
+    its game. split_factor is the number of subproblems made per worker. The
+    game's status is 'solved', 'unsolvable' or 'timeout', and an unsolved game
+    holds what propagation found.
+    '''
+    workers = workers or os.cpu_count()
+    current = solver.game(text)
+    source = text if text is not None else current.export() # Workers can not read the clipboard
+    current.limit(timeout)
+    try:
+        current.update_board()
+    except solver.contradiction:
+        current.abandon()
+        current.status = 'unsolvable'
+        return current
+    except solver.stopped as reason:
+        current.halt(reason)
+        return current
+    if current.solved():
+        current.status = 'solved'
+        return current
+
+    try:
+        [states, solution] = split(current, split_factor*workers)
+        current.status = 'unsolvable'
+    except solver.stopped as reason:
+        current.halt(reason) # Back to what propagation found
+        [states, solution] = [[], None]
+    if solution is None and states:
+        event = multiprocessing.Event()
+        with ProcessPoolExecutor(workers, initializer=start, initargs=(event,)) as executor:
+            pending = {executor.submit(explore, source, state) for state in states}
+            while pending and solution is None:
+                remaining = None if current.deadline is None else max(current.deadline-time.monotonic(), 0)
+                [done, pending] = wait(pending, remaining, return_when=FIRST_COMPLETED)
+                if not done:
+                    current.status = 'timeout'
+                    break
+                for future in done:
+                    if future.result() is not None:
+                        solution = future.result()
+            event.set()
+            for future in pending:
+                future.cancel()
+
+    if solution is not None:
+        current.fill(np.frombuffer(solution, dtype=np.int32, count=len(current.parents)))
+        current.status = 'solved'
+    return current
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('puzzle', help='a game ID, or a board or savefile file')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: one per core)')
+    parser.add_argument('--split', type=int, default=4,
+                        help='subproblems made per worker')
+    parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                        help='stop searching after this long and show what is known')
+    args = parser.parse_args()
+    text = args.puzzle
+    if os.path.isfile(text):
+        text = open(text).read()
+    start = time.perf_counter()
+    current = solve(text, args.workers, args.split, args.timeout)
+    current.display()
+    print('{} in {:.2f}s'.format(current.status, time.perf_counter()-start), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#! /usr/bin/env python
+'''
+Read Galaxies puzzles from Simon Tatham's savefiles and game IDs.
+
+A game ID looks like '7x7dn:fhwszzidfjhkc', the PARAMS and DESC of a savefile
+joined by a colon. PARAMS gives the board size in cells and the difficulty.
+DESC walks the (2w-1)x(2h-1) grid of positions inside the border in reading
+order: 'a' to 'y' skip 0 to 24 positions and place a dot, 'z' skips 25
+positions without one. Upper case letters are black dots, which the solver
+treats like any other.
+'''
+
+import re
+
+PARAMS = re.compile(r'(\d+)x(\d+)(?:d([a-z]))?$')
+GAMEID = re.compile(r'(\d+x\d+(?:d[a-z])?):([a-zA-Z]*)$')
+MINSIZE = 3 # Narrowest board Tatham's Galaxies allows, in cells
+
+def recognise(text):
+    '''
+    True if the text is a savefile or a game ID rather than an ascii board.
+    '''
+    text = text.strip()
+    return text.startswith('SAVEFILE:') or GAMEID.match(text) is not None
+
+def fields(text):
+    '''
+    Returns the fields of a savefile as a dict. Keys seen more than once, like
+    the MOVE of every move made, keep their first value.
+    '''
+    found = {}
+    rest = text
+    while rest.strip():
+        [key, length, rest] = rest.lstrip().split(':', 2)
+        found.setdefault(key.strip(), rest[:int(length)])
+        rest = rest[int(length):]
+    return found
+
+def parse_params(params):
+    '''
+    Returns the width and height in cells and the difficulty letter of a
+    PARAMS string like '7x7dn'. The difficulty is None if not given. Like
+    Tatham's Galaxies, boards under 3 cells wide or tall are refused.
+    '''
+    match = PARAMS.match(params)
+    if match is None:
+        raise ValueError('bad Galaxies parameters {!r}'.format(params))
+    [width, height] = [int(match.group(1)), int(match.group(2))]
+    if width < MINSIZE or height < MINSIZE:
+        raise ValueError('board of {}x{} cells is under {} a side'.format(width, height, MINSIZE))
+    return width, height, match.group(3)
+
+def decode_desc(width, height, desc):
+    '''
+    Returns the [row, col] board coordinates of every dot in a DESC string for
+    a board of width by height cells.
+    '''
+    span = 2*width-1 # Positions per row inside the border
+    positions = span*(2*height-1)
+    dots = []
+    position = 0
+    for char in desc:
+        if char == 'z':
+            position += 25
+            continue
+        if not 'a' <= char.lower() <= 'y':
+            raise ValueError('bad character {!r} in description'.format(char))
+        position += ord(char.lower()) - ord('a')
+        if position >= positions:
+            raise ValueError('description runs off the board')
+        dots.append([position//span + 1, position%span + 1])
+        position += 1
+    if position > positions:
+        raise ValueError('description runs off the board')
+    return dots
+
+def split(text):
+    '''
+    Returns the PARAMS and DESC strings of a savefile or game ID.
+    '''
+    text = text.strip()
+    if text.startswith('SAVEFILE:'):
+        found = fields(text)
+        if found.get('GAME') != 'Galaxies':
+            raise ValueError('not a Galaxies savefile')
+        return found['PARAMS'], found['DESC']
+    match = GAMEID.match(text)
+    if match is None:
+        raise ValueError('bad game ID {!r}'.format(text))
+    return match.groups()
+
+def read(text):
+    '''
+    Returns the width and height in cells and the dot coordinates of the
+    puzzle in a savefile or game ID. Moves saved in a savefile are ignored, the
+    puzzle is always read fresh.
+    '''
+    [params, desc] = split(text)
+    [width, height] = parse_params(params)[:2]
+    return width, height, decode_desc(width, height, desc)
+
+def encode_desc(width, height, dots):
+    '''
+    Returns the DESC string for dots at the given [row, col] board coordinates
+    on a board of width by height cells. The reverse of decode_desc.
+    '''
+    span = 2*width-1
+    desc = []
+    position = 0
+    for [row, col] in sorted(dots):
+        skip = (row-1)*span + col-1 - position
+        while skip > 24:
+            desc.append('z')
+            skip -= 25
+        desc.append(chr(ord('a') + skip))
+        position = (row-1)*span + col
+    return ''.join(desc)
+
+def game_id(width, height, dots, difficulty='n'):
+    '''
+    Returns the game ID of a puzzle, like '7x7dn:fhwszzidfjhkc'.
+    '''
+    return '{}x{}d{}:{}'.format(width, height, difficulty, encode_desc(width, height, dots))
+
+def write(width, height, dots, difficulty='n'):
+    '''
+    Returns a savefile holding the puzzle, which Tatham's Galaxies can load.
+    '''
+    params = '{}x{}d{}'.format(width, height, difficulty)
+    fields = [['SAVEFILE', "Simon Tatham's Portable Puzzle Collection"], ['VERSION', '1'],
+              ['GAME', 'Galaxies'], ['PARAMS', params], ['CPARAMS', params],
+              ['DESC', encode_desc(width, height, dots)], ['NSTATES', '1'], ['STATEPOS', '1']]
+    return ''.join('{:<8}:{}:{}\n'.format(key, len(value), value) for [key, value] in fields)
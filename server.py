@@ -0,0 +1,319 @@
+#! /usr/bin/env python
+'''
+Serve the Galaxies solver over HTTP.
+
+POST a JSON puzzle to /solve and get its result back as JSON, the same dict
+batch.py writes for each puzzle:
+
+    curl -d '{"board": "7x7dn:fhwszzidfjhkc"}' localhost:8080/solve
+
+The board may be ascii, a savefile or a game ID, and a bare JSON string is
+taken as the board. The object may also give a 'name', the 'method', 'stats'
+true for per rule counts, 'count' to count solutions up to a limit, 'steps' to
+bound the propagation steps, and a 'timeout' in seconds, which can not be
+longer than the server's. Boards wider or taller than the server's largest
+size are turned away with 413 before a worker spends time building them.
+
+Puzzles are solved on a fixed pool of worker processes that are started and
+warmed up before the server listens. Once every worker is busy and the queue
+behind them is full, new puzzles are turned away with 503 and a Retry-After
+header rather than piling up. The timeout is handed to the solver, so a
+puzzle that runs out of time or steps stops itself and is answered with its
+'status' and the 'partial' board it got to. The timeout runs from when the
+request arrives, so time spent queued behind busy workers counts against it.
+Only a worker that fails to stop within GRACE seconds of the timeout gets a
+504, and counts as busy until it finishes. A worker that dies, killed for
+running out of memory say, fails its puzzles with 500 and the pool is started
+afresh. GET /health reports the pool and what it has done.
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import batch
+import savefile
+
+WARMUP = '7x7dn:fhwszzidfjhkc'
+MAXBODY = 1 << 20 # Largest request body accepted, in bytes
+GRACE = 1.0 # Seconds past its timeout a solve is waited for before a 504
+MAXSIDE = 200 # Widest or tallest board accepted by default, in cells
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           408: 'Request Timeout', 413: 'Payload Too Large', 500: 'Internal Server Error',
+           503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+class failure(Exception):
+    '''
+    A request that gets an error response instead of a result.
+    '''
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def warm(cache):
+    '''
+    Runs once in every worker process as it starts. Opens the solutions cache
+    and solves a small puzzle so the first real request is not slowed by
+    imports and first calls.
+    '''
+    batch.solve_puzzle('warmup', WARMUP, cache=cache)
+
+def dimensions(board):
+    '''
+    Returns the width and height in cells of a board in any form solver.game
+    reads, without building it.
+    '''
+    if savefile.recognise(board):
+        return savefile.parse_params(savefile.split(board)[0])[:2]
+    lines = board.strip('\n').split('\n')
+    return max(len(line) for line in lines)//2, len(lines)//2
+
+async def read_request(reader):
+    '''
+    Returns the method, path and body of the next HTTP request on the
+    stream, or None once the client has closed it.
+    '''
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        [method, path, version] = line.decode('latin-1').split()
+    except ValueError:
+        raise failure(400, 'bad request line')
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        [key, sep, value] = line.decode('latin-1').partition(':')
+        headers[key.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise failure(400, 'bad Content-Length')
+    if length < 0:
+        raise failure(400, 'bad Content-Length')
+    if length > MAXBODY:
+        raise failure(413, 'request body over {} bytes'.format(MAXBODY))
+    return method, path.split('?')[0], await reader.readexactly(length)
+
+class server:
+    '''
+    An HTTP front end for a pool of solver processes.
+    '''
+
+    def __init__(self, workers=None, queue=None, timeout=30.0, cache=None, maxside=MAXSIDE):
+        self.workers = workers or os.cpu_count()
+        self.limit = self.workers + (2*self.workers if queue is None else queue) # Puzzles held at once
+        self.timeout = timeout # Longest a request may wait for its result, in seconds
+        self.maxside = maxside # Widest or tallest board accepted, in cells
+        self.cache = cache
+        self.pool = None
+        self.busy = 0 # Puzzles submitted to the pool and not yet finished
+        self.counts = dict.fromkeys(['requests', 'solved', 'unsolved', 'stopped', 'errors', 'rejected',
+                                     'timeouts', 'restarts'], 0)
+
+    async def start(self, host='127.0.0.1', port=8080):
+        '''
+        Start and warm up the workers, then listen for requests. Returns the
+        asyncio server.
+        '''
+        self.pool = self.new_pool()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.pool, os.getpid) for worker in range(self.workers)])
+        return await asyncio.start_server(self.handle, host, port)
+
+    def new_pool(self):
+        return ProcessPoolExecutor(self.workers, initializer=warm, initargs=(self.cache,))
+
+    def restart(self, pool):
+        '''
+        Replace a pool that a dead worker has broken. Its puzzles have all
+        failed with it, so none of them are busy any more. Only the first
+        request to see a pool break replaces it.
+        '''
+        if pool is not self.pool:
+            return
+        self.counts['restarts'] += 1
+        pool.shutdown(wait=False, cancel_futures=True)
+        self.pool = self.new_pool()
+        self.busy = 0
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    async def handle(self, reader, writer):
+        '''
+        Answer the requests of one connection, which is kept open for as
+        long as the client keeps sending them.
+        '''
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), self.timeout)
+                    if request is None:
+                        break
+                    [status, reply] = [200, await self.route(*request)]
+                except failure as error:
+                    [status, reply] = [error.status, {'error': str(error)}]
+                except asyncio.TimeoutError:
+                    [status, reply] = [408, {'error': 'request not received in time'}]
+                except asyncio.IncompleteReadError:
+                    break
+                except ConnectionError:
+                    raise
+                except Exception as error:
+                    print('Failed to answer a request: {!r}'.format(error), file=sys.stderr)
+                    [status, reply] = [500, {'error': 'internal error: {!r}'.format(error)}]
+                body = json.dumps(reply).encode()
+                head = ['HTTP/1.1 {} {}'.format(status, REASONS[status]),
+                        'Content-Type: application/json',
+                        'Content-Length: {}'.format(len(body))]
+                if status == 503:
+                    head.append('Retry-After: 1')
+                if status == 408:
+                    head.append('Connection: close')
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + body)
+                await writer.drain()
+                if status == 408:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, body):
+        '''
+        Returns the reply to one request as a dict.
+        '''
+        if path == '/health':
+            if method != 'GET':
+                raise failure(405, 'use GET for /health')
+            return self.health()
+        if path != '/solve':
+            raise failure(404, 'no such path {!r}'.format(path))
+        if method != 'POST':
+            raise failure(405, 'use POST for /solve')
+        try:
+            puzzle = json.loads(body)
+        except ValueError as error:
+            raise failure(400, 'bad JSON: {}'.format(error))
+        if isinstance(puzzle, str):
+            puzzle = {'board': puzzle}
+        if not isinstance(puzzle, dict) or not isinstance(puzzle.get('board'), str):
+            raise failure(400, "no 'board' string given")
+        return await self.solve(puzzle)
+
+    async def solve(self, puzzle):
+        '''
+        Solve a puzzle on the pool and return its result.
+        '''
+        self.counts['requests'] += 1
+        if self.busy >= self.limit:
+            self.counts['rejected'] += 1
+            raise failure(503, 'all {} workers busy and {} puzzles queued'.format(
+                self.workers, self.limit-self.workers))
+        method = puzzle.get('method', 'rules')
+        if method not in ['rules', 'exact']:
+            raise failure(400, 'unknown method {!r}'.format(method))
+        try:
+            timeout = min(float(puzzle.get('timeout', self.timeout)), self.timeout)
+            count = None if puzzle.get('count') is None else int(puzzle['count'])
+            steps = None if puzzle.get('steps') is None else int(puzzle['steps'])
+        except (TypeError, ValueError) as error:
+            raise failure(400, str(error))
+        try:
+            [width, height] = dimensions(puzzle['board'])
+        except (KeyError, ValueError) as error:
+            raise failure(400, 'could not read the board: {}'.format(error))
+        if max(width, height) > self.maxside:
+            raise failure(413, 'board of {}x{} cells is over {} a side'.format(width, height, self.maxside))
+
+        # The timeout runs from now, so time spent queued for a worker counts
+        # against the solve. A slot is only given back once the worker is
+        # really done, even if the client has stopped waiting for it
+        start = time.perf_counter()
+        deadline = time.monotonic()+timeout
+        pool = self.pool
+        try:
+            future = pool.submit(batch.solve_puzzle, str(puzzle.get('name', 'puzzle')), puzzle['board'],
+                                 method, bool(puzzle.get('stats')), self.cache, count, timeout, steps,
+                                 deadline)
+        except (BrokenProcessPool, RuntimeError):
+            self.restart(pool)
+            self.counts['errors'] += 1
+            raise failure(503, 'worker pool restarting')
+        self.busy += 1
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda future: loop.call_soon_threadsafe(self.release, pool))
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), deadline+GRACE-time.monotonic())
+        except asyncio.TimeoutError:
+            self.counts['timeouts'] += 1
+            raise failure(504, 'no result within {:g}s'.format(timeout))
+        except BrokenProcessPool:
+            self.restart(pool)
+            self.counts['errors'] += 1
+            raise failure(500, 'worker died while solving')
+        except Exception as error:
+            self.counts['errors'] += 1
+            raise failure(500, 'solver failed: {!r}'.format(error))
+        if 'error' in result:
+            self.counts['errors'] += 1
+            raise failure(400, result['error'])
+        if result['status'] in ['timeout', 'steps', 'cancelled']:
+            self.counts['stopped'] += 1
+        else:
+            self.counts['solved' if result['solved'] else 'unsolved'] += 1
+        result['wait'] = time.perf_counter()-start-result['seconds'] # Time spent queued and in transit
+        return result
+
+    def release(self, pool):
+        if pool is self.pool: # Puzzles of a replaced pool were let go with it
+            self.busy -= 1
+
+    def health(self):
+        return dict(self.counts, workers=self.workers, busy=min(self.busy, self.workers),
+                    queued=max(self.busy-self.workers, 0), limit=self.limit)
+
+async def serve(host, port, workers, queue, timeout, cache, maxside):
+    current = server(workers, queue, timeout, cache, maxside)
+    try:
+        listener = await current.start(host, port)
+        print('Serving on {}'.format(', '.join('{}:{}'.format(*socket.getsockname()[:2])
+                                                for socket in listener.sockets)), file=sys.stderr)
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        current.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='port to listen on')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: one per core)')
+    parser.add_argument('--queue', type=int, default=None,
+                        help='puzzles that may wait for a worker before new ones are turned away '
+                             '(default: two per worker)')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='longest a request may take, in seconds')
+    parser.add_argument('--cache', metavar='FILE',
+                        help='SQLite file of solutions to reuse and add to')
+    parser.add_argument('--max-size', type=int, default=MAXSIDE,
+                        help='widest or tallest board accepted, in cells')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.queue, args.timeout, args.cache,
+                          args.max_size))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#! /usr/bin/env python
+'''
+A persistent cache of solved Galaxies puzzles.
+
+Puzzles are keyed by their dot layout. Every layout is first turned into a
+canonical form under the eight rotations and reflections of the board, so a
+puzzle that comes back rotated or mirrored still hits the cache. Solutions are
+stored in the canonical orientation as the galaxy of every cell and turned
+back into the caller's orientation when they are loaded.
+
+The cache is a SQLite file. Once it holds more than limit solutions the least
+recently used ones are dropped.
+'''
+
+import hashlib
+import sqlite3
+import time
+import numpy as np
+
+def transform(array, turn):
+    '''
+    Returns the array under one of the eight symmetries of a rectangle,
+    numbered 0 to 7: turn%4 quarter turns, after a transpose if turn >= 4.
+    '''
+    if turn >= 4:
+        array = array.T
+    return np.rot90(array, turn%4)
+
+def untransform(array, turn):
+    '''
+    The inverse of transform.
+    '''
+    array = np.rot90(array, -(turn%4))
+    if turn >= 4:
+        array = array.T
+    return array
+
+def labels(game):
+    '''
+    Returns an array the size of the ascii board holding 1 plus the galaxy id
+    at every dot and 0 everywhere else.
+    '''
+    board = np.zeros((game.height, game.width), dtype=np.int32)
+    for dot in game.dots:
+        board[dot.row, dot.col] = dot.id + 1
+    return board
+
+def canonical(game):
+    '''
+    Returns the cache key of the game's dot layout and the symmetry that takes
+    the board to its canonical orientation.
+    '''
+    board = labels(game) > 0
+    forms = []
+    for turn in range(8):
+        layout = transform(board, turn)
+        forms.append([layout.shape, np.packbits(layout).tobytes(), turn])
+    [shape, packed, turn] = min(forms)
+    return hashlib.sha256('{}x{}:'.format(*shape).encode() + packed).hexdigest(), turn
+
+class cache:
+    '''
+    Solutions keyed by canonical dot layout, kept in a SQLite file.
+    '''
+
+    def __init__(self, path, limit=100000):
+        self.path = path
+        self.limit = limit # Most solutions kept before the least recently used go
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path, timeout=30)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS solutions '
+                                    '(key TEXT PRIMARY KEY, rows INTEGER, cols INTEGER, '
+                                    'owners BLOB, used REAL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS solutions_used ON solutions (used)')
+
+    def load(self, game):
+        '''
+        Write the cached solution onto the game if there is one. Returns True
+        on a hit. No rules are run.
+        '''
+        [key, turn] = canonical(game)
+        row = self.connection.execute('SELECT rows, cols, owners FROM solutions WHERE key = ?',
+                                      (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return False
+        with self.connection:
+            self.connection.execute('UPDATE solutions SET used = ? WHERE key = ?', (time.time(), key))
+        self.hits += 1
+
+        # Canonical galaxy ids are the order of the dots on the canonical
+        # board, so they map back through the transformed dot labels
+        [rows, cols, owners] = row
+        owners = np.frombuffer(owners, dtype=np.int32).reshape(rows, cols)
+        board = transform(labels(game), turn)
+        ids = board[board > 0] - 1 # Game id of every canonical id
+        game.fill(ids[untransform(owners, turn)].ravel())
+        return True
+
+    def store(self, game):
+        '''
+        Save the solution of a solved game.
+        '''
+        [key, turn] = canonical(game)
+        board = transform(labels(game), turn)
+        order = np.zeros(len(game.dots), dtype=np.int32) # Canonical id of every game id
+        order[board[board > 0] - 1] = np.arange(len(game.dots), dtype=np.int32)
+        owners = transform(order[game.parents].reshape(game.rows, game.cols), turn)
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?)',
+                                    (key, owners.shape[0], owners.shape[1],
+                                     np.ascontiguousarray(owners).tobytes(), time.time()))
+            self.connection.execute('DELETE FROM solutions WHERE key IN (SELECT key FROM solutions '
+                                    'ORDER BY used DESC LIMIT -1 OFFSET ?)', (self.limit,))
+
+    def stats(self):
+        '''
+        Returns the hits and misses of this cache object and the number of
+        solutions in the file.
+        '''
+        entries = self.connection.execute('SELECT COUNT(*) FROM solutions').fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
+
+    def close(self):
+        self.connection.close()
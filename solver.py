@@ -3,67 +3,206 @@
 A tool to solve Galaxies puzzles as implemented by Simon Tatham's Collection.
 '''
 
+import argparse
 import os
+import sys
+import time
+from collections import deque
+import numpy as np
 import pyperclip
+import exact_cover
+import instrument
+import savefile
+import solutions
+
+class contradiction(Exception):
+    '''
+    Raised when propagation reaches a state no solution can have.
+    '''
+
+class stopped(Exception):
+    '''
+    Raised when a solve runs out of time or steps or is cancelled.
+    '''
+
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status # 'timeout', 'steps' or 'cancelled'
+
+class rule:
+    '''
+    A propagation rule for update_board to schedule.
+    '''
+
+    def __init__(self, name, function, scope, events, cost, sweep=None):
+        self.name = name # Names the rule's queue and its counts in stats
+        self.function = function # Called with the game, then the cell or galaxy unless scope is 'board'
+        self.scope = scope # 'cell', 'galaxy' or 'board'
+        self.events = events # Which of 'parent', 'border', 'group' and 'complete' queue the rule
+        self.cost = cost # Rough cost of one call, cheaper rules always run first
+        self.sweep = sweep # Runs a cell rule over the whole board, for when much of it is queued
 
 class game:
     '''
     This class will describe the board and its characteristics.
     '''
 
-    def __init__(self):
+    def __init__(self, text=None, rules=None):
         '''
         Call modules to perform initial setup of the board.
         Populate some initial information about the board.
+        The board is read from text if given, otherwise as import_clean finds it.
+        The text may be an ascii board, a savefile or a game ID.
+        rules replaces RULES as the rules update_board runs.
         '''
         # Setup empty board
-        self.board = self.import_clean() # The board as a list of lists
-        self.width = len(self.board[0]) # The number of columns in the board
-        self.height = len(self.board) # The number of rows in the board
+        [self.width, self.height, positions] = self.read(text)
+        self.board = [[None]*self.width for rownum in range(self.height)] # The board as a list of lists
+        self.rows = (self.height-1)//2 # The number of rows of cells
+        self.cols = (self.width-1)//2 # The number of columns of cells
         self.dots = []
+        self.galaxies = {} # Galaxies keyed by a tuple of their coords
         self.cells = []
         self.notdots = []
         self.lines = []
         self.intersections = []
+        self.rules = sorted(RULES if rules is None else rules, key=lambda each: each.cost) # Cheapest first
+        self.pending = {each.name: deque() for each in self.rules} # Cells, galaxies or None queued for each rule
+        self.waiting = {each.name: set() for each in self.rules} # The same as sets, for quick membership tests
+        self.triggers = {} # Scope and queues of the rules each event queues
+        for each in self.rules:
+            for event in each.events:
+                self.triggers.setdefault(event, []).append([each.scope, self.pending[each.name], self.waiting[each.name]])
+        self.candidates = [] # Ids of the galaxies whose group holds each cell
+        self.shadows = [] # Ids of the galaxies whose group holds each cell's twin
+        self.trail = None # Undo records, only kept while searching
+        self.rounds = 0 # Times update_board has gone back to the cell rules
+        self.assigned = 0 # Parents set since the board was read
+        self.bordered = 0 # Borders added since the board was read
+        self.stats = None # An instrument.stats to count the rules with, if any
+        self.deadline = None # time.monotonic() at which solving stops, None for no limit
+        self.budget = None # Propagation steps allowed before solving stops, None for no limit
+        self.cancel = None # Anything with is_set(), like a threading.Event, that stops solving once set
+        self.steps = 0 # Propagation steps taken, one per cell, sweep, galaxy or exact cover choice
+        self.status = None # How the last solve or count ended, see solve
+        self.bulk = 0.1 # Share of the cells that must be queued before update_board sweeps the whole board, None to never sweep
+
+        # The board state lives in these arrays. The cell and line objects on
+        # the board are views onto them.
+        self.parents = np.full(self.rows*self.cols, -1, dtype=np.int32) # Galaxy id of each cell's parent, -1 if unknown
+        self.hborders = np.zeros((self.rows+1, self.cols), dtype=bool) # Borders on the lines above each cell
+        self.vborders = np.zeros((self.rows, self.cols+1), dtype=bool) # Borders on the lines left of each cell
 
         # Generate a list of all Galaxies
-        for rownum in range(1, self.height-1, 1):
-            for colnum in range(1, self.width-1, 1):
-                if 'o' in self.board[rownum][colnum]:
-                    self.dots.append(galaxy(rownum, colnum))
+        for [rownum, colnum] in sorted(positions):
+            self.dots.append(galaxy(self, rownum, colnum, len(self.dots)))
+            self.galaxies[(rownum, colnum)] = self.dots[-1]
 
         # Generate cell objects at all board cell locations
         for rownum in range(1, self.height-1, 2):
             for colnum in range(1, self.width-1, 2):
-                self.board[rownum][colnum] = cell(rownum, colnum, self.board[rownum][colnum])
+                dot = self.galaxies.get((rownum, colnum))
+                self.board[rownum][colnum] = cell(self, rownum, colnum, len(self.cells), ' ' if dot is None else 'o')
                 self.cells.append(self.board[rownum][colnum])
+                self.candidates.append(set())
+                self.shadows.append(set())
+                if dot is not None:
+                    self.parents[self.cells[-1].index] = dot.id
+                    dot.size += 1
 
+        # Only the edge of the board starts with borders
+        self.hborders[[0, -1], :] = True
+        self.vborders[:, [0, -1]] = True
         for rownum in range(self.height):
             for colnum in range(self.width):
                 if rownum%2==0 and colnum%2==1:
-                    self.board[rownum][colnum] = line(rownum, colnum, self.board[rownum][colnum])
+                    self.board[rownum][colnum] = line(self, rownum, colnum)
                     self.lines.append(self.board[rownum][colnum])
                 if rownum%2==1 and colnum%2==0:
-                    self.board[rownum][colnum] = line(rownum, colnum, self.board[rownum][colnum])
+                    self.board[rownum][colnum] = line(self, rownum, colnum)
                     self.lines.append(self.board[rownum][colnum])
                 if rownum%2==0 and colnum%2==0:
-                    self.board[rownum][colnum] = intersection(rownum, colnum, self.board[rownum][colnum])
+                    contents = 'o' if (rownum, colnum) in self.galaxies else '+'
+                    self.board[rownum][colnum] = intersection(rownum, colnum, contents)
                     self.intersections.append(self.board[rownum][colnum])
+
+        # Every cell and line learns its neighbours once. After this borders
+        # only update the cells on either side of them.
+        for each in self.lines:
+            if each.row%2==0:
+                each.sides = (self.board[each.row-1][each.col] if each.row > 0 else None,
+                              self.board[each.row+1][each.col] if each.row < self.height-1 else None)
+            else:
+                each.sides = (self.board[each.row][each.col-1] if each.col > 0 else None,
+                              self.board[each.row][each.col+1] if each.col < self.width-1 else None)
+        for each in self.cells:
+            [north, south] = [self.board[each.row-1][each.col], self.board[each.row+1][each.col]]
+            [west, east] = [self.board[each.row][each.col-1], self.board[each.row][each.col+1]]
+            each.links = ((north, north.sides[0]), (south, south.sides[1]), (west, west.sides[0]), (east, east.sides[1]))
+            # Only the edge of the board has borders so far
+            [each.north, each.south, each.west, each.east] = [wall if other is None else other for [wall, other] in each.links]
+
+        # Mirroring cell index i across a galaxy always gives base-i, so every
+        # galaxy's twin table is a view onto one shared descending range and
+        # every in-board mask is a view onto one shared window. The tables
+        # cost nothing per galaxy however large the board gets.
+        count = self.rows*self.cols
+        self.mirror = np.arange(2*count, -count, -1, dtype=np.int32)
+        self.window = np.zeros((3*self.rows, 3*self.cols), dtype=bool)
+        self.window[self.rows:2*self.rows, self.cols:2*self.cols] = True
+        for dot in self.dots:
+            base = (dot.row-1)*self.cols + dot.col-1
+            dot.twins = self.mirror[2*count-base:3*count-base]
+            dot.inboard = self.window[2*self.rows-dot.row:3*self.rows-dot.row,
+                                      2*self.cols-dot.col:3*self.cols-dot.col]
+        self.centres = np.array([dot.coords for dot in self.dots], dtype=np.int32).reshape(-1, 2) # Board coords of each dot
+
+        # Nothing has been propagated yet so the whole board starts dirty
+        self.dirty()
         return
 
-    def import_clean(self):
+    def read(self, text=None):
+        '''
+        Returns the width and height of the board and the coords of its dots.
+        Savefiles and game IDs are decoded directly, anything else is read as
+        an ascii board by import_clean.
         '''
-        Pulls a Galaxies board (ascii) from the 'text' file in directory or
-        clipboard and clean it up
+        if text is not None and savefile.recognise(text):
+            [cols, rows, positions] = savefile.read(text)
+            return 2*cols+1, 2*rows+1, positions
+        board = self.import_clean(text)
+        positions = [[rownum, colnum] for rownum in range(1, len(board)-1)
+                     for colnum in range(1, len(board[rownum])-1) if 'o' in board[rownum][colnum]]
+        return len(board[0]), len(board), positions
+
+    def import_clean(self, text=None):
+        '''
+        Pulls a Galaxies board (ascii) from the given text, the 'text' file in
+        directory or clipboard and clean it up
         '''
         # Store the board as list in variable 'test' each item is a line
         # Omits trailing empty line
-        if pyperclip.paste() and pyperclip.paste()[0] == '+':
+        if text is not None:
+            text = text.splitlines()
+        elif pyperclip.paste() and pyperclip.paste()[0] == '+':
             text = pyperclip.paste().split('\r\n')[:-1]
         elif os.path.isfile('text'):
             text = open('text').read().split('\n')[:-1]
         else:
-            print('ERROR')
+            raise ValueError('no board given, in the clipboard or in a text file')
+
+        # Refuse anything that is not a whole board: rows of equal length, an
+        # odd number of characters and rows of at least 3 and a + or a dot at
+        # every corner of every cell
+        if len(text) < 3 or len(text)%2 == 0:
+            raise ValueError('a board needs an odd number of rows, at least 3, not {}'.format(len(text)))
+        if len(text[0]) < 3 or len(text[0])%2 == 0:
+            raise ValueError('a board needs an odd width, at least 3, not {}'.format(len(text[0])))
+        for linenum in range(len(text)):
+            if len(text[linenum]) != len(text[0]):
+                raise ValueError('row {} is {} wide, not {}'.format(linenum, len(text[linenum]), len(text[0])))
+            if linenum%2 == 0 and text[linenum][::2].strip('+o'):
+                raise ValueError('row {} is missing a + between cells'.format(linenum))
 
         # Reset any moves made before copying. Finishes as a fresh puzzle.
         for linenum in range(1, len(text)-1 ): #ignore first and last lines
@@ -76,6 +215,12 @@ class game:
             text[linenum] = list(text[linenum])
         return text
 
+    def export(self):
+        '''
+        Returns the board as ascii in the same format import_clean reads.
+        '''
+        return ''.join(''.join(each.contents for each in row) + '\n' for row in self.board)
+
     def display(self):
         '''
         Neatly display an ascii representation of the board.
@@ -152,161 +297,629 @@ class game:
                 self.board[dot.row][dot.col-1].update_parent([dot.coords])
                 self.board[dot.row][dot.col+1].update_parent([dot.coords])
 
-            # Ensure cell attributes are up to date
-            for each in self.cells:
-                each.update_all()
+    def trigger(self, event, cells=(), ids=()):
+        '''
+        Queue the rules listening for the event: cell rules for the cells,
+        galaxy rules for the galaxies with the ids and board rules once.
+        '''
+        for [scope, pending, waiting] in self.triggers.get(event, ()):
+            if scope == 'cell':
+                for each in cells:
+                    if each not in waiting:
+                        waiting.add(each)
+                        pending.append(each)
+            elif scope == 'galaxy':
+                for id in ids:
+                    dot = self.dots[id]
+                    if dot not in waiting:
+                        waiting.add(dot)
+                        pending.append(dot)
+            elif None not in waiting:
+                waiting.add(None)
+                pending.append(None)
+
+    def dirty(self):
+        '''
+        Queue every rule for the whole board, as nothing on it has been
+        propagated.
+        '''
+        for each in self.rules:
+            targets = self.cells if each.scope == 'cell' else self.dots if each.scope == 'galaxy' else [None]
+            self.pending[each.name].extend(targets)
+            self.waiting[each.name].update(targets)
+
+    def parent_changed(self, each):
+        '''
+        Called when a cell gains a parent. Triggers the 'parent' event for the
+        cell itself and the galaxies whose groups could have included it, its
+        twin or its neighbours.
+        '''
+        dot = self.dots[self.parents[each.index]]
+        cells = [each]
+        if dot.size == 2 and dot.row%2==1 and dot.col%2==1: # three_borders can now use the dot's own cell
+            cells.append(self.board[dot.row][dot.col])
+        # A galaxy's group drops any cell whose twin is now taken
+        ids = self.candidates[each.index] | self.shadows[each.index]
+        ids.add(dot.id)
+        for [wall, other] in each.links:
+            if other is not None and not wall.border:
+                ids.update(self.candidates[other.index])
+        self.trigger('parent', cells, ids)
+
+    def border_changed(self, border):
+        '''
+        Called when a line becomes a border. Triggers the 'border' event for
+        the cells on either side of it and the galaxies that could reach them.
+        '''
+        [first, second] = border.sides
+        if first is None:
+            self.trigger('border', [second], self.candidates[second.index])
+        elif second is None:
+            self.trigger('border', [first], self.candidates[first.index])
+        else:
+            self.trigger('border', border.sides, self.candidates[first.index] | self.candidates[second.index])
 
-    def between_galaxies(self):
+    def between_galaxies(self, each):
         '''
         If an adjacent cell has a different known parent,
         places a border between the cells.
         '''
-        for each in self.cells:
-            if each.north.row%2==1 and each.parent:
-                if current.board[each.row-2][each.col].parent and each.parent != current.board[each.north.row][each.north.col].parent:
-                    current.board[each.row-1][each.col].is_border()
-            if each.south.row%2==1 and each.parent:
-                if current.board[each.row+2][each.col].parent and each.parent != current.board[each.south.row][each.south.col].parent:
-                    current.board[each.row+1][each.col].is_border()
-            if each.west.col%2==1 and each.parent:
-                if current.board[each.row][each.col-2].parent and each.parent != current.board[each.west.row][each.west.col].parent:
-                    current.board[each.row][each.col-1].is_border()
-            if each.east.col%2==1 and each.parent:
-                if current.board[each.row][each.col+2].parent and each.parent != current.board[each.east.row][each.east.col].parent:
-                    current.board[each.row][each.col+1].is_border()
+        parent = self.parents[each.index]
+        if parent < 0:
+            return
+        for [wall, other] in each.links:
+            if other is not None and self.parents[other.index] >= 0 and self.parents[other.index] != parent:
+                wall.is_border() # Does nothing if the wall is already a border
+
+    def three_borders(self, each):
+        '''
+        A cell with borders on three sides can only reach the rest of its
+        galaxy through the fourth, so the cell beyond it joins the galaxy.
+        Galaxies with only the one known cell may be just that cell and are
+        left alone.
+        '''
+        parent = self.parents[each.index]
+        if parent < 0 or self.dots[parent].size < 2:
+            return
+        exits = [other for [wall, other] in each.links if not wall.border]
+        if len(exits) == 1:
+            exits[0].update_parent([self.dots[parent].coords])
+
+    def enclosed_regions(self):
+        '''
+        Label the regions of cells without a parent, joined wherever no border
+        parts them. A region that only touches one galaxy belongs to it whole
+        and a region that touches none can not be reached at all. Every cell
+        without a parent is looked at once. Returns True if any cell was given
+        a parent.
+        '''
+        parents = self.parents
+        seen = bytearray(len(self.cells))
+        assigned = False
+        for start in np.flatnonzero(parents < 0):
+            if seen[start]:
+                continue
+            seen[start] = True
+            region = [self.cells[start]]
+            touching = set() # Ids of the galaxies next to the region
+            for each in region:
+                for [wall, other] in each.links:
+                    if wall.border:
+                        continue
+                    if parents[other.index] >= 0:
+                        touching.add(int(parents[other.index]))
+                    elif not seen[other.index]:
+                        seen[other.index] = True
+                        region.append(other)
+            if not touching:
+                raise contradiction('{} can not be reached by any galaxy'.format(region[0].coords))
+            if len(touching) == 1:
+                [id] = touching
+                for each in region:
+                    if parents[each.index] < 0:
+                        each.set_parent(id)
+                assigned = True
+        return assigned
 
     def get_twin(self, row, col, centerrow=[], centercol=[]):
         '''
         Returns coords pointing to the 'twin' of the cell described by the
-        input coordinates.
+        input coordinates, or None if the twin would be off the board.
         '''
         if centerrow == []:
-            centerrow=current.board[row][col].parent[0]
+            centerrow=self.board[row][col].parent[0]
         if centercol == []:
-            centercol=current.board[row][col].parent[1]
-        twinrow = centerrow - row + centerrow
-        twincol = centercol - col + centercol
-        return [twinrow, twincol]
+            centercol=self.board[row][col].parent[1]
+        twin = self.galaxies[(centerrow, centercol)].mirror(self.board[row][col])
+        if twin is not None:
+            return twin.coords
 
     def mirror_twin(self, row, col):
         '''
         Update a cell's twin to match the cell.
         Input is a cell's coords. Its twin will be updated.
         '''
-        if current.board[row][col].parent:
-            [twinrow, twincol] = self.get_twin(row, col)
-            current.board[twinrow][twincol].update_parent([current.board[row][col].parent])
+        if self.board[row][col].parent:
+            twin = self.board[row][col].twin
+            if twin is None:
+                raise contradiction('{} has no twin on the board'.format([row, col]))
+            [twinrow, twincol] = [twin.row, twin.col]
+            twin.update_parent([self.board[row][col].parent])
 
             # If the adjacent in any direction is a line
-            if current.board[row][col].north.border:
-                current.board[twinrow+1][twincol].is_border()
+            if self.board[row][col].north.border:
+                self.board[twinrow+1][twincol].is_border()
                 # print('Mirroring to {}'.format([twinrow+1, twincol]))
-            if current.board[row][col].south.border:
-                current.board[twinrow-1][twincol].is_border()
+            if self.board[row][col].south.border:
+                self.board[twinrow-1][twincol].is_border()
                 # print('Mirroring to {}'.format([twinrow-1, twincol]))
-            if current.board[row][col].west.border:
-                current.board[twinrow][twincol+1].is_border()
+            if self.board[row][col].west.border:
+                self.board[twinrow][twincol+1].is_border()
                 # print('Mirroring to {}'.format([twinrow, twincol+1]))
-            if current.board[row][col].east.border:
-                current.board[twinrow][twincol-1].is_border()
+            if self.board[row][col].east.border:
+                self.board[twinrow][twincol-1].is_border()
                 # print('Mirroring to {}'.format([twinrow, twincol-1]))
 
+    def sweep_between_galaxies(self):
+        '''
+        between_galaxies for every cell at once. Neighbouring parents are
+        compared as shifted arrays and each border found goes in through
+        line.is_border, so it propagates like any other.
+        '''
+        parents = self.parents.reshape(self.rows, self.cols)
+        known = parents >= 0
+        # Cells side by side, then cells one above the other
+        split = known[:, :-1] & known[:, 1:] & (parents[:, :-1] != parents[:, 1:]) & ~self.vborders[:, 1:-1]
+        for [row, col] in np.argwhere(split):
+            self.board[2*row+1][2*col+2].is_border()
+        split = known[:-1] & known[1:] & (parents[:-1] != parents[1:]) & ~self.hborders[1:-1]
+        for [row, col] in np.argwhere(split):
+            self.board[2*row+2][2*col+1].is_border()
+
+    def sweep_mirror_twin(self):
+        '''
+        mirror_twin for every cell at once. The twins of all cells with a
+        parent are gathered in one go from the shared tables every galaxy's
+        twins and inboard are views onto, and only the twins missing a parent
+        or a border are updated, through the usual setters.
+        '''
+        known = np.flatnonzero(self.parents >= 0)
+        ids = self.parents[known]
+        [rows, cols] = np.divmod(known, self.cols)
+        [dotrows, dotcols] = [self.centres[ids, 0], self.centres[ids, 1]]
+        inside = self.window[2*self.rows-dotrows+rows, 2*self.cols-dotcols+cols]
+        if not inside.all():
+            raise contradiction('{} has no twin on the board'.format(self.cells[known[inside.argmin()]].coords))
+        bases = (dotrows-1)*self.cols + dotcols-1
+        twins = self.mirror[2*self.rows*self.cols-bases+known]
+        [twinrows, twincols] = np.divmod(twins, self.cols)
+        for position in np.flatnonzero(self.parents[twins] != ids):
+            self.cells[twins[position]].update_parent([self.dots[ids[position]].coords])
+
+        # Each border of a cell belongs on the opposite side of its twin
+        [hborders, vborders] = [self.hborders, self.vborders]
+        for [mine, theirs, rowstep, colstep] in [
+                [hborders[rows, cols], hborders[twinrows+1, twincols], 2, 1],
+                [hborders[rows+1, cols], hborders[twinrows, twincols], 0, 1],
+                [vborders[rows, cols], vborders[twinrows, twincols+1], 1, 2],
+                [vborders[rows, cols+1], vborders[twinrows, twincols], 1, 0]]:
+            for position in np.flatnonzero(mine & ~theirs):
+                self.board[2*twinrows[position]+rowstep][2*twincols[position]+colstep].is_border()
+
+    def sweep_three_borders(self):
+        '''
+        three_borders for every cell at once. Borders around each cell are
+        counted as arrays, and only cells with three whose open side leads
+        out of their galaxy go through three_borders.
+        '''
+        [north, south] = [~self.hborders[:-1].ravel(), ~self.hborders[1:].ravel()]
+        [west, east] = [~self.vborders[:, :-1].ravel(), ~self.vborders[:, 1:].ravel()]
+        exits = north.astype(np.int8) + south + west + east
+        sizes = np.array([dot.size for dot in self.dots] + [0], dtype=np.int32) # Index -1 for no parent
+        walled = np.flatnonzero((exits == 1) & (sizes[self.parents] >= 2))
+        beyond = walled + self.cols*(south[walled].astype(np.int32) - north[walled]) + east[walled] - west[walled]
+        for index in walled[self.parents[beyond] != self.parents[walled]]:
+            self.three_borders(self.cells[index])
+
     def update_board(self):
         '''
-        Updates all cells on the board
+        Runs the rules until none has anything left to do. Each rule is
+        queued by the events it listens for, and the cheapest rule with work
+        queued always goes next, running on everything queued for it so far.
+        Galaxy groups are only rebuilt once the cell rules have run dry,
+        potential dots are only trusted once every group is rebuilt, and the
+        whole board is only searched for enclosed regions after that. While a
+        large part of the board is queued for a cell rule with a sweep, the
+        sweep runs over the whole board as arrays instead. A new round starts
+        whenever a cheaper rule gets work again. Raises stopped once the game's
+        deadline, budget or cancel token says so, leaving the rest of the
+        queues unpropagated.
         '''
-        done = False
-        while not done: # Continue until no changes are being made
-            done = True
-            previous = [row[:] for row in current.board]
-            # Store state before performing update
-            for rownum in range(current.height):
-                for colnum in range(current.width):
-                    previous[rownum][colnum] = current.board[rownum][colnum].contents
+        stats = self.stats
+        last = None # Cost of the rule that ran last
+        while True:
+            for active in self.rules:
+                if self.pending[active.name]:
+                    break
+            else:
+                return
+            if last is None or active.cost < last:
+                self.rounds += 1
+                if stats is not None:
+                    stats.new_round()
+            last = active.cost
+            pending = self.pending[active.name]
+            waiting = self.waiting[active.name]
+            if active.sweep is not None and self.bulk is not None and len(pending) >= self.bulk*len(self.cells):
+                self.tick()
+                pending.clear()
+                waiting.clear()
+                if stats is None:
+                    active.sweep(self)
+                else:
+                    stats.run(self, active.sweep.__name__, active.sweep, self)
+                continue
+            for _ in range(len(pending)): # Work queued while this runs waits for cheaper rules
+                self.tick()
+                target = pending.popleft()
+                waiting.discard(target)
+                args = [self] if active.scope == 'board' else [self, target]
+                if stats is None:
+                    active.function(*args)
+                else:
+                    stats.run(self, active.name, active.function, *args)
 
-            # Actually update the board
-            self.between_galaxies()
-            for each in self.cells:
-                self.mirror_twin(each.row, each.col)
-                each.update_all()
+    def tick(self):
+        '''
+        Count one propagation step. Raises stopped once the budget is spent,
+        the deadline has passed or the cancel token is set.
+        '''
+        self.steps += 1
+        if self.budget is not None and self.steps > self.budget:
+            raise stopped('steps')
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise stopped('timeout')
+        if self.cancel is not None and self.cancel.is_set():
+            raise stopped('cancelled')
 
-            for dot in current.dots:
-                dot.check_completion()
+    def limit(self, timeout=None, steps=None, cancel=None):
+        '''
+        Bound the next solve or count to timeout seconds from now, steps more
+        propagation steps and the cancel token. None leaves that one unbounded.
+        '''
+        self.deadline = None if timeout is None else time.monotonic()+timeout
+        self.budget = None if steps is None else self.steps+steps
+        self.cancel = cancel
 
-            # Check for changes against previous state
-            for rownum in range(current.height):
-                for colnum in range(current.width):
-                    if previous[rownum][colnum] != current.board[rownum][colnum].contents: # Break if no changes are made
-                        done = False
+    def halt(self, reason):
+        '''
+        Give up solving after stopped was raised. Parents and borders found by
+        propagation are kept and guesses made by the search are taken back, so
+        the board holds only what is certain.
+        '''
+        if self.trail is not None:
+            self.abandon()
+            self.undo(0)
+            self.trail = None
+        else:
+            for each in self.rules:
+                if each.scope == 'galaxy':
+                    for dot in self.pending[each.name]: # Their completion was never rechecked
+                        dot.complete = False
+            self.abandon()
+        self.status = reason.status
+
+    def partial(self):
+        '''
+        Returns what is known of the board as plain lists, ready for JSON: the
+        galaxy id of every cell's parent (-1 if unknown), the borders above
+        and left of every cell and the ids of the completed galaxies.
+        '''
+        return {'parents': self.parents.tolist(),
+                'hborders': self.hborders.tolist(),
+                'vborders': self.vborders.tolist(),
+                'complete': [dot.id for dot in self.dots if dot.complete]}
+
+    def solved(self):
+        '''
+        True once every cell has a parent.
+        '''
+        return not (self.parents < 0).any()
+
+    def undo(self, mark):
+        '''
+        Roll the board back to when the trail was mark entries long.
+        '''
+        while len(self.trail) > mark:
+            record = self.trail.pop()
+            if record[0] == 'parent':
+                self.dots[self.parents[record[1]]].size -= 1
+                self.parents[record[1]] = -1
+            elif record[0] == 'border':
+                record[1].clear_border()
+            elif record[0] == 'group':
+                [kind, dot, group, complete, joined, left] = record
+                dot.group = group
+                dot.complete = complete
+                for each in joined:
+                    self.candidates[each.index].discard(dot.id)
+                    self.shadows[dot.mirror(each).index].discard(dot.id)
+                for each in left:
+                    self.candidates[each.index].add(dot.id)
+                    self.shadows[dot.mirror(each).index].add(dot.id)
+
+    def abandon(self):
+        '''
+        Drop any propagation still pending after a contradiction.
+        '''
+        for each in self.rules:
+            self.pending[each.name].clear()
+            self.waiting[each.name].clear()
+
+    def fill(self, parents):
+        '''
+        Write a known solution onto the board, given as the galaxy id of every
+        cell. Borders, groups and sizes are set to match and no rules are run.
+        '''
+        self.abandon()
+        self.parents[:] = parents
+        grid = self.parents.reshape(self.rows, self.cols)
+        self.hborders[1:-1] = grid[:-1] != grid[1:]
+        self.vborders[:, 1:-1] = grid[:, :-1] != grid[:, 1:]
+        for dot in self.dots:
+            dot.group = []
+            dot.complete = True
+        for each in self.cells:
+            each.update_adjacent()
+            self.dots[self.parents[each.index]].group.append(each)
+            self.candidates[each.index] = {int(self.parents[each.index])}
+            self.shadows[each.index] = {int(self.parents[each.index])}
+        for dot in self.dots:
+            dot.size = len(dot.group)
+
+    def state(self):
+        '''
+        Returns the board state as compact bytes, for handing subproblems to
+        other processes: the parents, then the borders packed to bits.
+        '''
+        return (self.parents.tobytes() + np.packbits(self.hborders).tobytes()
+                + np.packbits(self.vborders).tobytes())
+
+    def restore(self, state):
+        '''
+        Put the board back into a state from state(). Groups are rebuilt from
+        scratch, so every rule is queued for the whole board.
+        '''
+        self.abandon()
+        self.trail = None
+        count = self.parents.nbytes
+        hbytes = (self.hborders.size+7)//8
+        self.parents[:] = np.frombuffer(state, dtype=np.int32, count=len(self.parents))
+        self.hborders[:] = np.unpackbits(np.frombuffer(state, np.uint8, hbytes, count),
+                                         count=self.hborders.size).reshape(self.hborders.shape)
+        self.vborders[:] = np.unpackbits(np.frombuffer(state, np.uint8, offset=count+hbytes),
+                                         count=self.vborders.size).reshape(self.vborders.shape)
+        sizes = np.bincount(self.parents[self.parents >= 0], minlength=len(self.dots))
+        for dot in self.dots:
+            dot.group = []
+            dot.complete = False
+            dot.size = int(sizes[dot.id])
+        for each in self.cells:
+            each.update_adjacent()
+            self.candidates[each.index] = set()
+            self.shadows[each.index] = set()
+        self.dirty()
+
+    def branch_cell(self):
+        '''
+        Returns the unassigned cell with the fewest potential dots, or None if
+        every cell is assigned.
+        '''
+        best = None
+        for each in self.cells:
+            if self.parents[each.index] < 0:
+                if best is None or len(self.candidates[each.index]) < len(self.candidates[best.index]):
+                    best = each
+                    if len(self.candidates[best.index]) == 2:
+                        break
+        return best
+
+    def solve(self, method='rules'):
+        '''
+        Solve the board. Propagation runs first and the chosen backend finishes
+        whatever it leaves: 'rules' for the backtracking search or 'exact' for
+        the exact cover solver. Returns True if the board was solved.
+        Afterwards status is 'solved', 'unsolvable', or 'timeout', 'steps' or
+        'cancelled' if a limit stopped the solve first. A stopped board keeps
+        everything propagation found, see halt.
+        '''
+        try:
+            self.update_board()
+            if self.solved():
+                self.status = 'solved'
+                return True
+            if method == 'exact':
+                solved = exact_cover.solve(self)
+            else:
+                solved = self.search()
+        except contradiction:
+            self.abandon()
+            self.status = 'unsolvable'
+            return False
+        except stopped as reason:
+            self.halt(reason)
+            return False
+        self.status = 'solved' if solved else 'unsolvable'
+        return solved
+
+    def search(self):
+        '''
+        Backtracking search for when update_board stalls. Returns True if the
+        board was solved.
+        '''
+        for solution in self.explore():
+            return True
+        return False
+
+    def count(self, limit=2, keep=None):
+        '''
+        Count the solutions of the board, stopping as soon as limit have been
+        found. The board is left on the first solution found, if any. If a
+        limit stops the count the solutions found so far are returned and
+        status says which limit it was. With a keep list a copy of the
+        parents of every solution found is added to it.
+        '''
+        try:
+            self.update_board()
+        except contradiction:
+            self.abandon()
+            self.status = 'unsolvable'
+            return 0
+        except stopped as reason:
+            self.halt(reason)
+            return 0
+        if self.solved(): # Propagation only makes forced moves, so this is the only solution
+            self.status = 'solved'
+            if keep is not None:
+                keep.append(self.parents.copy())
+            return 1
+        found = 0
+        first = None
+        try:
+            for solution in self.explore():
+                found += 1
+                if first is None:
+                    first = self.parents.copy()
+                if keep is not None:
+                    keep.append(self.parents.copy())
+                if found >= limit:
+                    break
+            self.status = 'solved' if found else 'unsolvable'
+        except stopped as reason:
+            self.halt(reason)
+        self.trail = None
+        if first is not None:
+            self.fill(first)
+        return found
+
+    def explore(self):
+        '''
+        Branches on the most constrained cell and propagates each guess.
+        Contradictions are undone through the trail rather than by copying the
+        board. Yields each time the board is solved and carries on with the
+        next guess when resumed, so every solution is visited once.
+        '''
+        self.trail = []
+        try:
+            self.update_board()
+        except contradiction:
+            self.abandon()
+            return
+
+        stack = [] # [trail length, cell, galaxy ids still to try] per guess
+        while True:
+            each = self.branch_cell()
+            if each is None:
+                yield
+                if not stack: # Solved without guessing, there is nothing else to try
+                    return
+            else:
+                stack.append([len(self.trail), each, sorted(self.candidates[each.index])])
+            while stack:
+                [mark, each, ids] = stack[-1]
+                self.undo(mark)
+                if not ids: # Every guess failed so the previous guess was wrong
+                    stack.pop()
+                    continue
+                try:
+                    each.set_parent(ids.pop(0))
+                    self.update_board()
+                    break
+                except contradiction:
+                    self.abandon()
+            else:
+                return
 
 class cell:
     '''
     This class will describe all the possible characteristics of a single cell.
+    The parent is stored in game.parents, the cell is only a view onto it.
     '''
-    def __init__(self, row, col, contents=''):
+    __slots__ = ['game', 'row', 'col', 'index', 'contents', 'links',
+                 'north', 'south', 'west', 'east']
+    border = False # A cell will never be a border...
+
+    def __init__(self, game, row, col, index, contents=''):
         '''
         Perform an initial scan of the board to initialize all variables
         '''
-        self.potdots = [] # List of potential dots the cell could belong to
-        self.parent = []
-        self.coords = [row, col]
+        self.game = game # The game whose board holds the cell
         self.row = row
         self.col = col
+        self.index = index # Position of the cell in game.parents
         self.contents = contents # If the cell contained a 'o' store it here
-        self.twin = [] # If parents is known. This will be the cell's twin
-        self.path = [] # List of the cells that could be next in the path
-        self.border = False # A cell will never be a border...
+        self.links = () # (line, cell) to the north, south, west and east, cell None off the board
 
-        if 'o' in contents:
-            self.parent = self.coords
+    @property
+    def coords(self):
+        return [self.row, self.col]
 
-    def update_adjacent(self):
+    @property
+    def parent(self):
         '''
-        Update adjacent directions to be the coordinates of the nearest
-        adjacent object in that direction
+        Coords of the galaxy the cell belongs to, or [] if it is unknown.
         '''
-        if current.board[self.row-1][self.col].border:
-            self.north = current.board[self.row-1][self.col]
-        else:
-            self.north = current.board[self.row-2][self.col]
-        if current.board[self.row+1][self.col].border:
-            self.south = current.board[self.row+1][self.col]
-        else:
-            self.south = current.board[self.row+2][self.col]
-        if current.board[self.row][self.col-1].border:
-            self.west = current.board[self.row][self.col-1]
-        else:
-            self.west = current.board[self.row][self.col-2]
-        if current.board[self.row][self.col+1].border:
-            self.east = current.board[self.row][self.col+1]
-        else:
-            self.east = current.board[self.row][self.col+2]
+        parent = self.game.parents[self.index]
+        if parent < 0:
+            return []
+        return self.game.dots[parent].coords
 
-        self.nwcorner = [self.row-1, self.col-1]
-        self.swcorner = [self.row+1, self.col-1]
-        self.necorner = [self.row-1, self.col+1]
-        self.secorner = [self.row+1, self.col+1]
+    @property
+    def potdots(self):
+        '''
+        Coords of every galaxy the cell could belong to.
+        '''
+        if self.parent:
+            return [self.parent]
+        return [self.game.dots[id].coords for id in sorted(self.game.candidates[self.index])]
 
-        self.adjacent = [self.north.coords, self.south.coords, self.west.coords, self.east.coords]
-                        # self.nwcorner, self.swcorner, self.necorner, self.secorner]
-        return
+    @property
+    def twin(self):
+        '''
+        The cell mirrored across the parent, or None if that would be off the
+        board. Only valid once the parent is known.
+        '''
+        return self.game.dots[self.game.parents[self.index]].mirror(self)
 
-    def update_potdots(self):
+    @property
+    def adjacent(self):
+        return [self.north.coords, self.south.coords, self.west.coords, self.east.coords]
+
+    def update_adjacent(self):
         '''
-        Check other cells to identify all potential parents
+        Update adjacent directions to be the nearest adjacent object in that
+        direction, the line if it is a border and the cell beyond otherwise.
+        line.is_border and line.clear_border keep them up to date, so this is
+        never needed while solving.
         '''
-        if self.parent: # if the parent is already known don't bother looking for one
-            self.potdots = [self.parent]
-        else:
-            self.potdots = []
-            for dot in current.dots: # Look at each galaxy
-                for each in dot.group: # Look at each item of the group in each galaxy
-                    # If the dot could potentially parent the cell add it to the list
-                    if self.coords == each.coords and dot.coords not in self.potdots:
-                        self.potdots.append(dot.coords)
+        [[north, northcell], [south, southcell], [west, westcell], [east, eastcell]] = self.links
+        self.north = north if north.border else northcell
+        self.south = south if south.border else southcell
+        self.west = west if west.border else westcell
+        self.east = east if east.border else eastcell
 
-        if len(self.potdots) == 1:
-            self.parent = self.potdots[0]
+    def update_potdots(self):
+        '''
+        Assign the parent if only one galaxy can still reach the cell.
+        '''
+        candidates = self.game.candidates[self.index]
+        if self.game.parents[self.index] >= 0:
+            return
+        if not candidates:
+            raise contradiction('{} can not be reached by any galaxy'.format(self.coords))
+        if len(candidates) == 1:
+            for id in candidates:
+                self.set_parent(id)
 
     def update_parent(self, parentlist=[]):
         '''
@@ -316,12 +929,25 @@ class cell:
 
         if parentlist == False: # if no argument given
             parentlist = self.potdots # use the list of potential parents
-            self.parent = 'xxx'
         if not self.parent and len(parentlist) == 1:
-            self.parent = parentlist[0]
+            self.set_parent(self.game.galaxies[tuple(parentlist[0])].id)
+        elif len(parentlist) == 1 and self.parent != parentlist[0]:
+            raise contradiction('{} can not belong to both {} and {}'.format(self.coords, self.parent, parentlist[0]))
 
-        self.twin = current.get_twin(self.row, self.col)
-        self.twin = current.board[self.twin[0]][self.twin[1]]
+    def set_parent(self, id):
+        '''
+        Store the galaxy id as the cell's parent and propagate the change.
+        '''
+        # The cell can not share a galaxy with a cell across a border
+        for [wall, other] in self.links:
+            if other is not None and wall.border and self.game.parents[other.index] == id:
+                raise contradiction('{} is walled off from its galaxy'.format(self.coords))
+        self.game.parents[self.index] = id
+        self.game.dots[id].size += 1
+        self.game.assigned += 1
+        if self.game.trail is not None:
+            self.game.trail.append(('parent', self.index))
+        self.game.parent_changed(self)
 
     def update_all(self):
         '''
@@ -342,130 +968,306 @@ class galaxy:
     '''
     A class to describe all dots and their galaxies.
     '''
-    def __init__(self, row, col):
+    def __init__(self, game, row, col, id):
+        self.game = game # The game whose board holds the dot
         self.row = row
         self.col = col
+        self.id = id # Index into game.dots, as stored in game.parents
+        self.twins = None # Index of each cell's twin across the dot, set by game
+        self.inboard = None # Rows x cols mask of cells whose twin is on the board
         self.coords = [row, col]
         self.complete = False
         self.group = []
+        self.size = 0 # Number of cells known to belong to the galaxy
+
+    def mirror(self, each):
+        '''
+        Returns the cell mirrored across the dot, or None if that would be off
+        the board.
+        '''
+        if self.inboard[each.row//2, each.col//2]:
+            return self.game.cells[self.twins[each.index]]
 
     def check_completion(self):
         '''
         Checks if the galaxy is completed. If so updates the variable.
+        Keeps game.candidates and game.shadows in step with the group
+        and returns the cells that joined or left it.
         '''
+        parents = self.game.parents
+        complete = self.complete
         self.complete = True # Default to true until proven otherwise
         # Select starting points for each group
-        self.group = []
+        previous = set(self.group)
         if self.row%2==1 and self.col%2==1:
-            self.group.append(current.board[self.row][self.col])
+            start = self.game.board[self.row][self.col]
         elif self.row%2==0 and self.col%2==1:
-            self.group.append(current.board[self.row-1][self.col])
+            start = self.game.board[self.row-1][self.col]
         elif self.row%2==1 and self.col%2==0:
-            self.group.append(current.board[self.row][self.col-1])
+            start = self.game.board[self.row][self.col-1]
         elif self.row%2==0 and self.col%2==0:
-            self.group.append(current.board[self.row-1][self.col-1])
-
-        # add appropriate adjacent cells to the group
-        for cell in self.group:
-            if cell.north.row%2==1: # Ensure the potential is a cell
-                if not cell.north.parent or cell.north.parent == self.coords: # Proceed if the potential has no parent or if the parent is the same
-                    twin = current.get_twin(cell.north.row, cell.north.col, self.row, self.col)
-                    if 0 < twin[0] < current.height and 0 < twin[1] < current.width: # Make sure twin is inside board
-                        twin = current.board[twin[0]][twin[1]]
-                        if twin.parent == [] or twin.parent == self.coords: # Proceed if the twin is valid
-                            if cell.north not in self.group: # Proceed if the potential is not already in the group
-                                self.group.append(cell.north)
-                else: # If the search encounters a cell that belongs to another galaxy mark this galaxy as incomplete
-                    self.complete = False
-            if cell.south.row%2==1:
-                if not cell.south.parent or cell.south.parent == self.coords:
-                    twin = current.get_twin(cell.south.row, cell.south.col, self.row, self.col)
-                    if 0 < twin[0] < current.height and 0 < twin[1] < current.width:
-                        twin = current.board[twin[0]][twin[1]]
-                        if twin.parent == [] or twin.parent == self.coords:
-                            if cell.south not in self.group:
-                                self.group.append(cell.south)
-                else:
-                    self.complete = False
-            if cell.west.col%2==1:
-                if not cell.west.parent or cell.west.parent == self.coords:
-                    twin = current.get_twin(cell.west.row, cell.west.col, self.row, self.col)
-                    if 0 < twin[0] < current.height and 0 < twin[1] < current.width:
-                        twin = current.board[twin[0]][twin[1]]
-                        if twin.parent == [] or twin.parent == self.coords:
-                            if cell.west not in self.group:
-                                self.group.append(cell.west)
-                else:
-                    self.complete = False
-            if cell.east.col%2==1:
-                if not cell.east.parent or cell.east.parent == self.coords:
-                    twin = current.get_twin(cell.east.row, cell.east.col, self.row, self.col)
-                    if 0 < twin[0] < current.height and 0 < twin[1] < current.width:
-                        twin = current.board[twin[0]][twin[1]]
-                        if twin.parent == [] or twin.parent == self.coords:
-                            if cell.east not in self.group:
-                                self.group.append(cell.east)
-                else:
+            start = self.game.board[self.row-1][self.col-1]
+        self.group = [start]
+        reached = {start} # The same cells as the group, for quick membership tests
+
+        # Add appropriate adjacent cells to the group. Parents and borders are
+        # only ever added, so a group can only shrink once it has been built.
+        # Cells outside the previous group can be skipped without checking
+        # their twin.
+        for each in self.group:
+            for other in [each.north, each.south, each.west, each.east]:
+                if other.border or other in reached: # Only cells not yet in the group
+                    continue
+                owner = parents[other.index]
+                if owner >= 0 and owner != self.id: # The search met another galaxy
                     self.complete = False
+                elif not previous or other in previous:
+                    twin = self.mirror(other)
+                    if twin is not None and parents[twin.index] in (-1, self.id): # Twin must be inside the board and free
+                        reached.add(other)
+                        self.group.append(other)
+
+        changed = previous.symmetric_difference(self.group)
+        joined = []
+        left = []
+        for each in changed:
+            if each in previous:
+                left.append(each)
+                self.game.candidates[each.index].discard(self.id)
+                self.game.shadows[self.mirror(each).index].discard(self.id)
+            else:
+                joined.append(each)
+                self.game.candidates[each.index].add(self.id)
+                self.game.shadows[self.mirror(each).index].add(self.id)
+        if self.game.trail is not None and (changed or complete != self.complete):
+            self.game.trail.append(('group', self, list(previous), complete, joined, left))
+
+        # Every cell of the galaxy must be reachable from the dot
+        if sum(1 for each in self.group if self.game.parents[each.index] == self.id) < self.size:
+            raise contradiction('{} is split in two'.format(self.coords))
+        self.game.trigger('group', changed)
+        if self.complete and not complete:
+            self.game.trigger('complete', self.group, [self.id])
+        return changed
 
 class line:
     '''
     This class will describe all the possible characteristics of a line.
+    The border is stored in game.hborders or game.vborders, the line is only a
+    view onto it.
     '''
-    def __init__(self, row, col, contents=''):
+    __slots__ = ['game', 'row', 'col', 'sides']
+    potdots = [] # A line never has potential dots
+    parent = []
+
+    def __init__(self, game, row, col):
         '''
         Perform an initial scan of the board to initialize all variables
         '''
-        self.potdots = [] # List of potential dots the cell could belong to
-        self.parent = []
-        self.coords = [row, col]
+        self.game = game # The game whose board holds the line
         self.row = row
         self.col = col
-        self.contents = contents # If the cell contained a '-' or '|' store it here
-        self.border = False
-        if '-' in contents or '|' in contents:
-            self.border = True
+        self.sides = () # The cells north and south or west and east, None off the board
+
+    @property
+    def coords(self):
+        return [self.row, self.col]
+
+    @property
+    def border(self):
+        if self.row%2==0:
+            return bool(self.game.hborders[self.row//2, self.col//2])
+        return bool(self.game.vborders[self.row//2, self.col//2])
+
+    @property
+    def contents(self):
+        '''
+        The ascii representation of the line.
+        '''
+        if self.border:
+            if self.row%2==0:
+                return '-'
+            return '|'
+        if (self.row, self.col) in self.game.galaxies:
+            return 'o'
+        return ' '
 
     def is_border(self):
         '''
         Sets self.border to True to when called.
         '''
-        self.border = True
+        if self.border:
+            return
+        [before, after] = self.sides # Only the board's edge lacks a side and it starts as a border
         if self.row%2==0:
-            self.contents = '-'
+            self.game.hborders[self.row//2, self.col//2] = True
+            [before.south, after.north] = [self, self]
         if self.col%2==0:
-            self.contents = '|'
+            self.game.vborders[self.row//2, self.col//2] = True
+            [before.east, after.west] = [self, self]
+        self.game.bordered += 1
+        if self.game.trail is not None:
+            self.game.trail.append(('border', self))
+        parents = self.game.parents
+        if parents[before.index] >= 0 and parents[before.index] == parents[after.index]:
+            raise contradiction('{} splits a galaxy'.format(self.coords))
+        self.game.border_changed(self)
+
+    def clear_border(self):
+        '''
+        Removes the border again. Only used to undo a guess.
+        '''
+        [before, after] = self.sides
+        if self.row%2==0:
+            self.game.hborders[self.row//2, self.col//2] = False
+            [before.south, after.north] = [after, before]
+        if self.col%2==0:
+            self.game.vborders[self.row//2, self.col//2] = False
+            [before.east, after.west] = [after, before]
 
 class intersection:
     '''
     This class will describe all the possible characteristics of a line.
     '''
+    __slots__ = ['row', 'col', 'contents']
+    potdots = [] # An intersection never has potential dots
+    parent = []
+    border = False
+
     def __init__(self, row, col, contents=''):
         '''
         Perform an initial scan of the board to initialize all variables
         '''
-        self.potdots = [] # List of potential dots the cell could belong to
-        self.parent = []
-        self.coords = [row, col]
         self.row = row
         self.col = col
         self.contents = contents # If the cell contained a '+' or 'o' store it here
-        self.dot = False
-        if 'o' in self.contents:
-            self.dot = True
 
-def main():
-    global current
-    current = game()
+    @property
+    def coords(self):
+        return [self.row, self.col]
+
+    @property
+    def dot(self):
+        return 'o' in self.contents
+
+# The rules update_board runs, cheapest first. A rule is queued by the events
+# it lists: 'parent' when a cell gains a parent, 'border' when a line becomes a
+# border, 'group' when a cell joins or leaves a galaxy's group and 'complete'
+# when a galaxy is completed. Each event names the cells and galaxies it
+# touched, and a rule runs on those for its scope. Every rule starts queued on
+# the whole board, so edge_dots with no events only runs then. New rules only
+# need an entry here.
+RULES = [
+    rule('edge_dots', game.edge_dots, 'board', [], 0),
+    rule('between_galaxies', game.between_galaxies, 'cell', ['parent'], 1, game.sweep_between_galaxies),
+    rule('mirror_twin', lambda current, each: current.mirror_twin(each.row, each.col), 'cell', ['parent', 'border'], 1, game.sweep_mirror_twin),
+    rule('three_borders', game.three_borders, 'cell', ['parent', 'border'], 1, game.sweep_three_borders),
+    rule('check_completion', lambda current, dot: dot.check_completion(), 'galaxy', ['parent', 'border'], 2),
+    rule('update_potdots', lambda current, each: each.update_potdots(), 'cell', ['group'], 3),
+    rule('enclosed_regions', game.enclosed_regions, 'board', ['parent', 'border'], 4),
+]
+
+def solve(text=None, method='rules', stats=None, cache=None, timeout=None, steps=None, cancel=None):
+    '''
+    Solve a puzzle and return its game, finished as far as it could be. Every
+    game owns its board and rule state, so any number can be solved side by
+    side, in threads or one after another. With a solutions.cache a cached
+    solution is used if there is one and new solutions are added to it.
+    timeout, steps and cancel bound the solve as game.limit does, with the
+    time spent reading the board counted against timeout. The game's status
+    tells whether one of them stopped it.
+    '''
+    start = time.monotonic()
+    current = game(text)
+    current.stats = stats # Left with no counts if the solution is cached
+    if cache is not None and cache.load(current):
+        current.status = 'solved'
+        return current
+    current.limit(None if timeout is None else timeout-(time.monotonic()-start), steps, cancel)
+    if current.solve(method) and cache is not None:
+        cache.store(current)
+    return current
+
+def main(method='rules', text=None, stats=None, trace=False, cache=None, timeout=None, steps=None):
+    current = game(text)
+    current.limit(timeout, steps)
+    if stats is not None:
+        current.stats = instrument.stats(trace)
     print('\nEmpty board:')
     current.display() #Show empty board
 
+    if cache is not None and cache.load(current):
+        print('From cache:')
+        current.display()
+        if stats is not None:
+            current.stats.dump(stats)
+        return current
+
     # Perform obvious assignments
-    current.edge_dots()
-    current.update_board()
+    try:
+        current.update_board()
+    except contradiction:
+        current.abandon()
+        current.status = 'unsolvable'
+    except stopped as reason:
+        current.halt(reason)
     print('After obvious assignments:')
     current.display()
 
+    if current.status == 'unsolvable':
+        print('No solution found.')
+    elif current.status is None and not current.solved():
+        if current.solve(method):
+            print('After search:')
+        elif current.status == 'unsolvable':
+            print('No solution found:')
+        else:
+            print('Stopped ({}) after {} steps:'.format(current.status, current.steps))
+        current.display()
+    elif current.status is not None:
+        print('Stopped ({}) after {} steps.'.format(current.status, current.steps))
+
+    if stats is not None:
+        current.stats.dump(stats)
+    if cache is not None and current.solved():
+        cache.store(current)
+    return current
+
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--method', choices=['rules', 'exact'], default='rules',
+                        help='how to finish boards propagation can not solve')
+    parser.add_argument('--stats', metavar='FILE',
+                        help='write per rule counts for update_board to a JSON file')
+    parser.add_argument('--trace', action='store_true',
+                        help='with --stats, also keep every rule call as a trace event')
+    parser.add_argument('--count', type=int, metavar='LIMIT',
+                        help='count solutions instead, stopping at LIMIT (2 checks uniqueness)')
+    parser.add_argument('--cache', metavar='FILE',
+                        help='SQLite file of solutions to reuse and add to')
+    parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                        help='stop solving after this long and show what is known')
+    parser.add_argument('--steps', type=int,
+                        help='stop solving after this many propagation steps')
+    parser.add_argument('puzzle', nargs='?',
+                        help='a game ID, or a board or savefile to read instead of the clipboard')
+    args = parser.parse_args()
+    text = args.puzzle
+    if text is not None and os.path.isfile(text):
+        text = open(text).read()
+    if args.count is not None:
+        current = game(text)
+        current.limit(args.timeout, args.steps)
+        found = current.count(args.count)
+        more = found >= args.count or current.status not in ['solved', 'unsolvable']
+        print('Solutions found: {}{}'.format(found, ' or more' if more else ''))
+        current.display()
+        sys.exit(0)
+    cache = None
+    if args.cache is not None:
+        cache = solutions.cache(args.cache)
+    main(args.method, text, args.stats, args.trace, cache, args.timeout, args.steps)
+    if cache is not None:
+        print('Cache: {hits} hits, {misses} misses, {entries} solutions'.format(**cache.stats()))
+        cache.close()
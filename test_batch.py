@@ -0,0 +1,53 @@
+#! /usr/bin/env python
+'''
+Regression checks for solving puzzles in batches.
+
+Run with python -m unittest or pytest.
+'''
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import batch
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GAMEID = '7x7dn:fhwszzidfjhkc' # The puzzle in the seed savefile
+
+class stats(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.cache = os.path.join(self.folder.name, 'cache.db')
+
+    def test_cached_puzzle(self):
+        first = batch.solve_puzzle('first', GAMEID, stats=True, cache=self.cache)
+        second = batch.solve_puzzle('second', GAMEID, stats=True, cache=self.cache)
+        self.assertTrue(first['solved'] and second['solved'])
+        self.assertFalse(first['cached'])
+        self.assertTrue(second['cached'])
+        self.assertTrue(first['stats'])
+        self.assertEqual(second['stats'], {})
+
+    def test_command_line(self):
+        # seed and its game ID are the same puzzle, so the second is a cache hit
+        puzzles = os.path.join(self.folder.name, 'puzzles.jsonl')
+        with open(os.path.join(HERE, 'seed')) as stream:
+            boards = [stream.read(), GAMEID]
+        with open(puzzles, 'w') as stream:
+            stream.writelines(json.dumps(board) + '\n' for board in boards)
+        counts = os.path.join(self.folder.name, 'stats.json')
+        finished = subprocess.run([sys.executable, os.path.join(HERE, 'batch.py'), puzzles, '--workers', '1',
+                                   '--stats', counts, '--cache', self.cache],
+                                  capture_output=True, text=True, timeout=120)
+        self.assertEqual(finished.returncode, 0, finished.stderr)
+        results = [json.loads(line) for line in finished.stdout.splitlines()]
+        self.assertEqual([result['cached'] for result in results], [False, True])
+        with open(counts) as stream:
+            self.assertIn('edge_dots', json.load(stream)['rules'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+#! /usr/bin/env python
+'''
+Regression checks for reading puzzles and counting their solutions.
+
+game.count is compared against a brute force enumerator on small generated
+boards, and the seed puzzle is taken through savefile's DESC encoding and back.
+Run with python -m unittest or pytest.
+'''
+
+import os
+import random
+import unittest
+import generator
+import savefile
+import solver
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def brute_force(width, height, dots, limit):
+    '''
+    Count the ways to split the board into galaxies, up to limit, by trying
+    every dot for every cell in turn. A cell takes its twin across the dot
+    along with it, the cells touching a dot must be its own and every
+    galaxy must be connected.
+    '''
+    count = width*height
+    owner = [-1]*count
+    forced = [-1]*count # The galaxy whose dot touches each cell
+    for [id, [dotrow, dotcol]] in enumerate(dots):
+        for row in range((dotrow-1)//2, dotrow//2+1):
+            for col in range((dotcol-1)//2, dotcol//2+1):
+                forced[row*width+col] = id
+
+    def twin(index, id):
+        [row, col] = divmod(index, width)
+        [twinrow, twincol] = [dots[id][0]-row-1, dots[id][1]-col-1]
+        if 0 <= twinrow < height and 0 <= twincol < width:
+            return twinrow*width + twincol
+        return None
+
+    def connected():
+        for id in range(len(dots)):
+            cells = {index for index in range(count) if owner[index] == id}
+            start = cells.pop()
+            stack = [start]
+            while stack:
+                [row, col] = divmod(stack.pop(), width)
+                for [other, inside] in [[row*width+col-1, col > 0], [row*width+col+1, col < width-1],
+                                        [(row-1)*width+col, row > 0], [(row+1)*width+col, row < height-1]]:
+                    if inside and other in cells:
+                        cells.discard(other)
+                        stack.append(other)
+            if cells:
+                return False
+        return True
+
+    def search(index):
+        if index == count:
+            return 1 if connected() else 0
+        if owner[index] >= 0:
+            return search(index+1)
+        found = 0
+        for id in range(len(dots)) if forced[index] < 0 else [forced[index]]:
+            other = twin(index, id)
+            if other is None or owner[other] >= 0 or forced[other] not in (-1, id):
+                continue
+            owner[index] = owner[other] = id
+            found += search(index+1)
+            owner[index] = owner[other] = -1
+            if found >= limit:
+                break
+        return found
+
+    return search(0)
+
+def scatter(width, height, number, rng):
+    '''Place up to number dots at random, no two touching the same cell'''
+    [dots, taken] = [[], set()]
+    for attempt in range(4*number):
+        [row, col] = [rng.randint(1, 2*height-1), rng.randint(1, 2*width-1)]
+        cells = {(r, c) for r in range((row-1)//2, row//2+1) for c in range((col-1)//2, col//2+1)}
+        if len(dots) < number and not cells & taken:
+            dots.append([row, col])
+            taken |= cells
+    return dots
+
+class count(unittest.TestCase):
+
+    def test_matches_brute_force(self):
+        for [width, height] in [[3, 3], [4, 4], [5, 4], [5, 5], [6, 5], [6, 6]]:
+            for seed in range(30):
+                [dots, owner] = generator.generate(width, height, seed, maxsize=12)
+                current = solver.game(savefile.game_id(width, height, dots))
+                with self.subTest(width=width, height=height, seed=seed):
+                    self.assertEqual(current.count(20), brute_force(width, height, dots, 20))
+
+    def test_scattered_dots(self):
+        # Random layouts are mostly impossible, which generated ones never are
+        rng = random.Random(0)
+        for [width, height] in [[3, 3], [4, 3], [4, 4]]:
+            for number in range(2, 7):
+                for attempt in range(4):
+                    dots = scatter(width, height, number, rng)
+                    current = solver.game(savefile.game_id(width, height, dots))
+                    with self.subTest(width=width, height=height, dots=dots):
+                        self.assertEqual(current.count(20), brute_force(width, height, dots, 20))
+
+    def test_unsolvable(self):
+        self.assertEqual(solver.game('3x3dn:a').count(2), 0)
+
+    def test_keeps_solutions(self):
+        [dots, owner] = generator.generate(4, 4, 1, maxsize=6)
+        current = solver.game(savefile.game_id(4, 4, dots))
+        found = []
+        self.assertEqual(current.count(20, found), len(found))
+        self.assertEqual(len({each.tobytes() for each in found}), len(found))
+
+class exact(unittest.TestCase):
+
+    def test_solves_what_brute_force_can(self):
+        rng = random.Random(1)
+        boards = [[width, height, generator.generate(width, height, seed, maxsize=12)[0]]
+                  for [width, height] in [[4, 4], [5, 5], [6, 6]] for seed in range(20)]
+        boards += [[width, height, scatter(width, height, number, rng)]
+                   for [width, height] in [[3, 3], [4, 4]] for number in range(2, 7) for attempt in range(4)]
+        for [width, height, dots] in boards:
+            current = solver.solve(savefile.game_id(width, height, dots), 'exact')
+            with self.subTest(width=width, height=height, dots=dots):
+                self.assertEqual(current.solved(), brute_force(width, height, dots, 1) == 1)
+                self.assertEqual(current.status, 'solved' if current.solved() else 'unsolvable')
+
+class parse(unittest.TestCase):
+
+    def test_seed_round_trip(self):
+        with open(os.path.join(HERE, 'seed')) as stream:
+            text = stream.read()
+        [params, desc] = savefile.split(text)
+        [width, height] = [7, 7]
+        dots = savefile.decode_desc(width, height, desc)
+        self.assertEqual(savefile.encode_desc(width, height, dots), desc)
+        self.assertEqual(savefile.read(text), savefile.read('{}:{}'.format(params, desc)))
+        self.assertEqual(len(solver.game(text).dots), len(dots))
+        self.assertEqual(solver.game(text).count(2), 1)
+
+    def test_rejects_boards_under_three_cells(self):
+        for text in ['0x0dn:', '2x5dn:', '5x1dn:a']:
+            with self.subTest(text=text):
+                self.assertRaises(ValueError, solver.game, text)
+
+    def test_rejects_text_that_is_not_a_board(self):
+        for text in ['hello', 'o', '+\n', '+-+-+\n| |\n+-+-+\n']:
+            with self.subTest(text=text):
+                self.assertRaises(ValueError, solver.game, text)
+
+if __name__ == '__main__':
+    unittest.main()